@@ -1,6 +1,6 @@
 # app/__init__.py
 import os
-from flask import Flask, jsonify, send_from_directory
+from flask import Flask, jsonify, request
 from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
@@ -41,6 +41,9 @@ api = Api(
 
 def create_app():
     app = Flask(__name__, static_url_path='/static')
+    # Multipart files are streamed to disk and validated while they arrive (see upload_pipeline)
+    from app.utils.upload_pipeline import UploadRequest
+    app.request_class = UploadRequest
     app.config.from_object(Config)
     db.init_app(app)
     migrate.init_app(app, db)
@@ -62,10 +65,27 @@ def create_app():
         }), 413
 
     app.config['MAX_CONTENT_LENGTH'] = Config.MAX_CONTENT_LENGTH
-    # Route for serving uploaded files
+    # Route for serving uploaded files; ?w=&h=&fmt=webp returns a resized variant
     @app.route('/get/<path:filename>')
     def serve_image(filename):
-        return send_from_directory(os.path.abspath(app.config['UPLOAD_FOLDER']), filename)
+        from app.utils.uploads import send_upload
+        try:
+            return send_upload(filename,
+                               width=request.args.get('w', type=int),
+                               height=request.args.get('h', type=int),
+                               fmt=request.args.get('fmt'))
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+
+    # Process metrics (LLM latency, circuit breaker state, etc.) — Admin/Owner only
+    from app.models.user_model import Role
+    from app.utils.util import role_required
+
+    @app.route('/metrics')
+    @role_required(Role.ADMIN, Role.OWNER)
+    def metrics_snapshot():
+        from app.utils import metrics
+        return jsonify(metrics.snapshot())
 
     # Enable CORS
     CORS(app, resources={r"/*": {
@@ -78,6 +98,9 @@ def create_app():
     # Middleware for authentication and role checking
     from app.utils.auth_middleware import setup_auth_middleware
     setup_auth_middleware(app)
+    from app.utils.revocation import setup_token_revocation, setup_jwt_errors
+    setup_token_revocation(app)
+    setup_jwt_errors(api)
 
     # Register API namespaces
     from .routes.auth_routes import auth_ns
@@ -98,6 +121,14 @@ def create_app():
     api.add_namespace(users_ns)
     api.add_namespace(role_ns)
 
+    # CLI: flask import-users users.csv, flask purge-uploads, flask sweep-uploads
+    from app.utils.user_import import import_users_command
+    from app.utils.upload_store import purge_uploads_command
+    from app.utils.upload_gc import sweep_uploads_command, start_upload_gc
+    app.cli.add_command(import_users_command)
+    app.cli.add_command(purge_uploads_command)
+    app.cli.add_command(sweep_uploads_command)
+
     # Error handler
     @app.errorhandler(403)
     def forbidden(error):
@@ -106,7 +137,12 @@ def create_app():
             'error': str(error)
         }), 403
 
+    from app.utils.catalog_cache import ensure_catalog_version
     with app.app_context():
         db.create_all()  # Create all tables
+        ensure_catalog_version()
+
+    # Scheduled removal of orphaned upload files
+    start_upload_gc(app)
 
     return app
@@ -1,5 +1,9 @@
 # config.py
 import os
+from dotenv import load_dotenv
+
+# Variables from app/.env must be visible before the class body reads them
+load_dotenv()
 
 class Config:
     # Database configuration
@@ -8,6 +12,13 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY', 'your-secret-key')
     # JWT configuration
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'super-secret')
+    ACCESS_TOKEN_TTL_MINUTES = int(os.getenv('ACCESS_TOKEN_TTL_MINUTES', 30))
+    REFRESH_TOKEN_TTL_DAYS = int(os.getenv('REFRESH_TOKEN_TTL_DAYS', 14))
+    # Revoked token store: bloom filter in front of the revoked_token table
+    REVOCATION_BLOOM_BITS = int(os.getenv('REVOCATION_BLOOM_BITS', 1 << 20))
+    REVOCATION_BLOOM_HASHES = int(os.getenv('REVOCATION_BLOOM_HASHES', 7))
+    REVOCATION_SYNC_INTERVAL = float(os.getenv('REVOCATION_SYNC_INTERVAL', 5))  # seconds; picks up other workers' revocations
+    REVOCATION_REBUILD_INTERVAL = float(os.getenv('REVOCATION_REBUILD_INTERVAL', 3600))
     # CORS configuration
     CORS_ORIGINS = [ "http://localhost:3000" , "*" ]
     CORS_SUPPORTS_CREDENTIALS = True
@@ -15,4 +26,115 @@ class Config:
     CORS_METHODS = ["GET", "POST", "PUT", "DELETE", "OPTIONS"]
 
     UPLOAD_FOLDER = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'static', 'uploads'))
-    MAX_CONTENT_LENGTH = 16 * 1024 * 1024
\ No newline at end of file
+    MAX_CONTENT_LENGTH = 16 * 1024 * 1024
+    # Product and pet photos; checked while the body streams in, before it is fully received
+    UPLOAD_IMAGE_MAX_BYTES = int(os.getenv('UPLOAD_IMAGE_MAX_MB', 8)) * 1024 * 1024
+    UPLOAD_IMAGE_MAX_PIXELS = int(os.getenv('UPLOAD_IMAGE_MAX_PIXELS', 40_000_000))
+    # Uploads never change under a given name, so clients may cache them for a year
+    UPLOAD_CACHE_MAX_AGE = int(os.getenv('UPLOAD_CACHE_MAX_AGE', 31536000))
+    # Let the front proxy (nginx/Apache with X-Sendfile support) send file bodies
+    USE_X_SENDFILE = os.getenv('USE_X_SENDFILE', 'false').lower() == 'true'
+    # Seconds an unreferenced content-addressed upload is kept before purge-uploads deletes it
+    UPLOAD_BLOB_GRACE = int(os.getenv('UPLOAD_BLOB_GRACE', 3600))
+    # Background sweeper for upload files no row references, in seconds. Off by default: it deletes files,
+    # so enable it after checking `flask sweep-uploads --dry-run` against the existing upload folder
+    UPLOAD_GC_INTERVAL = int(os.getenv('UPLOAD_GC_INTERVAL', 0))
+    UPLOAD_GC_GRACE = int(os.getenv('UPLOAD_GC_GRACE', 86400))  # orphans younger than this are kept
+    UPLOAD_GC_BATCH = int(os.getenv('UPLOAD_GC_BATCH', 500))  # file names checked per query
+
+    # Upload storage backend: 'local' (UPLOAD_FOLDER) or 's3' (any S3-compatible server, needs boto3)
+    UPLOAD_STORAGE = os.getenv('UPLOAD_STORAGE', 'local')
+    S3_BUCKET = os.getenv('S3_BUCKET')
+    S3_PREFIX = os.getenv('S3_PREFIX', 'uploads/')
+    S3_ENDPOINT_URL = os.getenv('S3_ENDPOINT_URL')  # e.g. http://localhost:9000 for MinIO; unset for AWS
+    S3_REGION = os.getenv('S3_REGION')
+    S3_ACCESS_KEY_ID = os.getenv('S3_ACCESS_KEY_ID')
+    S3_SECRET_ACCESS_KEY = os.getenv('S3_SECRET_ACCESS_KEY')
+    # How /get serves remote objects: 'redirect' to a presigned URL or 'proxy' the body through the app
+    UPLOAD_SERVE_MODE = os.getenv('UPLOAD_SERVE_MODE', 'redirect')
+    S3_PRESIGN_TTL = int(os.getenv('S3_PRESIGN_TTL', 3600))  # seconds a presigned URL stays valid
+
+    # Resized image variants (/get/<file>?w=&h=&fmt=webp), cached in UPLOAD_FOLDER/.variants
+    IMAGE_VARIANT_SIZES = sorted(int(v) for v in os.getenv('IMAGE_VARIANT_SIZES', '160,320,640,1280').split(','))
+    IMAGE_VARIANT_PRESETS = [int(v) for v in os.getenv('IMAGE_VARIANT_PRESETS', '320,640').split(',') if v]  # widths built at upload
+    IMAGE_VARIANT_PRESET_FORMATS = os.getenv('IMAGE_VARIANT_PRESET_FORMATS', 'webp').split(',')
+    IMAGE_VARIANT_QUALITY = int(os.getenv('IMAGE_VARIANT_QUALITY', 80))
+    IMAGE_VARIANT_CACHE_MAX_BYTES = int(os.getenv('IMAGE_VARIANT_CACHE_MAX_MB', 512)) * 1024 * 1024
+
+    # Chat history and prompt window
+    CHAT_HISTORY_PAGE_SIZE = int(os.getenv('CHAT_HISTORY_PAGE_SIZE', 50))
+    CHAT_HISTORY_MAX_PAGE_SIZE = int(os.getenv('CHAT_HISTORY_MAX_PAGE_SIZE', 200))
+    CHAT_PROMPT_WINDOW = int(os.getenv('CHAT_PROMPT_WINDOW', 5))  # latest messages sent verbatim
+    CHAT_PROMPT_MESSAGE_CHARS = int(os.getenv('CHAT_PROMPT_MESSAGE_CHARS', 1000))
+    CHAT_SUMMARY_BATCH = int(os.getenv('CHAT_SUMMARY_BATCH', 5))  # messages folded into the summary at once
+    CHAT_SUMMARY_MAX_CHARS = int(os.getenv('CHAT_SUMMARY_MAX_CHARS', 1500))
+    CHAT_IMAGE_MAX_SIDE = int(os.getenv('CHAT_IMAGE_MAX_SIDE', 1024))  # px, longest side sent to the vision model
+    CHAT_IMAGE_JPEG_QUALITY = int(os.getenv('CHAT_IMAGE_JPEG_QUALITY', 80))
+
+    # Chat document attachments
+    DOC_EXTRACT_MAX_CHARS = int(os.getenv('DOC_EXTRACT_MAX_CHARS', 200000))
+    DOCX_MAX_XML_BYTES = int(os.getenv('DOCX_MAX_XML_MB', 20)) * 1024 * 1024  # unpacked word/document.xml
+    DOC_CHUNK_CHARS = int(os.getenv('DOC_CHUNK_CHARS', 800))
+    DOC_CONTEXT_MAX_CHARS = int(os.getenv('DOC_CONTEXT_MAX_CHARS', 3000))  # document text per prompt
+    DOC_EXTRACT_WAIT = float(os.getenv('DOC_EXTRACT_WAIT', 10))  # seconds a chat reply waits for extraction
+
+    # Public catalog GETs carry a weak ETag from the catalog write counter; clients revalidate after this many seconds
+    CATALOG_CACHE_MAX_AGE = int(os.getenv('CATALOG_CACHE_MAX_AGE', 0))
+    # Server-side cache of those responses (0 TTL disables); invalidated by catalog writes
+    CATALOG_CACHE_TTL = float(os.getenv('CATALOG_CACHE_TTL', 30))
+    CATALOG_CACHE_MAX_BYTES = int(os.getenv('CATALOG_CACHE_MAX_MB', 64)) * 1024 * 1024  # per process
+    # Seconds an expired or invalidated response may still be served while one background task rebuilds it (0 = off)
+    CATALOG_CACHE_STALE_TTL = float(os.getenv('CATALOG_CACHE_STALE_TTL', 0))
+    CATALOG_CACHE_COALESCE_WAIT = float(os.getenv('CATALOG_CACHE_COALESCE_WAIT', 10))  # seconds a request waits for a concurrent rebuild
+    # Where invalidations are recorded: memory (this worker only), sqlite (one machine) or redis (needs redis package)
+    CATALOG_CACHE_BACKEND = os.getenv('CATALOG_CACHE_BACKEND', 'memory')
+    CATALOG_CACHE_SQLITE_PATH = os.getenv('CATALOG_CACHE_SQLITE_PATH', os.path.join(os.path.dirname(__file__), '..', 'catalog_cache.sqlite'))
+    CATALOG_CACHE_REDIS_URL = os.getenv('CATALOG_CACHE_REDIS_URL', 'redis://localhost:6379/0')
+
+    # Category member listings (/categories/<id>/products, /categories/<id>/pets)
+    CATEGORY_MEMBERS_PAGE_SIZE = int(os.getenv('CATEGORY_MEMBERS_PAGE_SIZE', 50))
+    CATEGORY_MEMBERS_MAX_PAGE_SIZE = int(os.getenv('CATEGORY_MEMBERS_MAX_PAGE_SIZE', 200))
+
+    # User administration listings
+    USERS_PAGE_SIZE = int(os.getenv('USERS_PAGE_SIZE', 50))
+    USERS_MAX_PAGE_SIZE = int(os.getenv('USERS_MAX_PAGE_SIZE', 200))
+    USERS_BULK_MAX_IDS = int(os.getenv('USERS_BULK_MAX_IDS', 500))  # user_ids per bulk ban/role request
+    USER_IMPORT_BATCH_SIZE = int(os.getenv('USER_IMPORT_BATCH_SIZE', 500))  # CSV rows hashed and inserted together
+    USER_IMPORT_MAX_ERRORS = int(os.getenv('USER_IMPORT_MAX_ERRORS', 1000))  # row errors listed in the report
+    USER_IMPORT_HTTP_MAX_ROWS = int(os.getenv('USER_IMPORT_HTTP_MAX_ROWS', 2000))  # larger files go through `flask import-users`
+
+    # Authenticated user context cache (per process); bans apply within the TTL on other workers
+    USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', 30))
+    USER_CACHE_MAX_SIZE = int(os.getenv('USER_CACHE_MAX_SIZE', 10000))
+
+    # Password hashing (also read by Flask-Bcrypt)
+    BCRYPT_LOG_ROUNDS = int(os.getenv('BCRYPT_LOG_ROUNDS', 12))
+    PASSWORD_POOL_WORKERS = int(os.getenv('PASSWORD_POOL_WORKERS', 0))  # 0 = one process per CPU
+    PASSWORD_POOL_QUEUE = int(os.getenv('PASSWORD_POOL_QUEUE', 16))  # waiting jobs beyond the busy workers
+    PASSWORD_POOL_WAIT = float(os.getenv('PASSWORD_POOL_WAIT', 1))  # seconds to wait for a queue slot
+
+    # Rate limiting: token buckets per namespace, "capacity/seconds"
+    RATE_LIMITS = {
+        'chat': os.getenv('RATE_LIMIT_CHAT', '10/60'),
+        'login': os.getenv('RATE_LIMIT_LOGIN', '5/60'),
+    }
+    RATE_LIMIT_STORAGE = os.getenv('RATE_LIMIT_STORAGE', 'memory')  # memory or sqlite (shared by workers)
+    RATE_LIMIT_SQLITE_PATH = os.getenv('RATE_LIMIT_SQLITE_PATH', os.path.join(os.path.dirname(__file__), '..', 'rate_limits.sqlite'))
+
+    # Background work
+    BACKGROUND_WORKERS = int(os.getenv('BACKGROUND_WORKERS', 2))
+
+    # LLM provider: openai, local (any OpenAI-compatible server) or stub (offline, deterministic)
+    LLM_BACKEND = os.getenv('LLM_BACKEND', 'openai')
+    LLM_MODEL = os.getenv('LLM_MODEL', 'gpt-4o')
+    LLM_BASE_URL = os.getenv('LLM_BASE_URL', 'http://localhost:8000/v1')  # used by the local backend
+    LLM_API_KEY = os.getenv('LLM_API_KEY')  # used by the local backend
+    LLM_STUB_LATENCY_MS = int(os.getenv('LLM_STUB_LATENCY_MS', 0))
+
+    # LLM provider limits
+    LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', 20))  # seconds per completion call
+    LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', 1))
+    LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', 8))  # in-flight calls per process
+    LLM_QUEUE_TIMEOUT = float(os.getenv('LLM_QUEUE_TIMEOUT', 2))  # seconds to wait for a free slot
+    LLM_BREAKER_FAILURE_THRESHOLD = int(os.getenv('LLM_BREAKER_FAILURE_THRESHOLD', 5))
+    LLM_BREAKER_RESET_TIMEOUT = float(os.getenv('LLM_BREAKER_RESET_TIMEOUT', 30))
@@ -0,0 +1,12 @@
+from datetime import datetime
+from app import db
+
+class CatalogVersion(db.Model):
+    """Single-row write counter for products, pets and categories; public catalog ETags are derived from it"""
+    __tablename__ = 'catalog_version'
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<CatalogVersion {self.version}>'
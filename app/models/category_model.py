@@ -5,23 +5,19 @@ class Category(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), unique=True, nullable=False)
     description = db.Column(db.String(300))
-    products = db.relationship('Product', backref='category', lazy=True)
-    pets = db.relationship('Pet', backref='category', lazy=True)
+    # passive_deletes: deleting a category must not load its members (the route checks EXISTS first)
+    products = db.relationship('Product', backref='category', lazy=True, passive_deletes=True)
+    pets = db.relationship('Pet', backref='category', lazy=True, passive_deletes=True)
 
     def __repr__(self):
         return f'<Category {self.name}>'
 
-    def to_dict(self):
+    def to_dict(self, product_count=None, pet_count=None):
+        # Counts come from aggregate queries (see category_routes); members are listed on sub-routes
         return {
             'id': self.id,
             'name': self.name,
             'description': self.description,
-            'products': [
-                {'id': p.id, 'name': p.name, 'price': float(p.price)}
-                for p in self.products
-            ],
-            'pets': [
-                {'id': p.id, 'name': p.name, 'species': p.species}
-                for p in self.pets
-            ]
+            'product_count': product_count,
+            'pet_count': pet_count
         }
@@ -4,6 +4,9 @@ from app import db
 
 class ChatMessage(db.Model):
     __tablename__ = 'chat_message'
+    __table_args__ = (
+        db.Index('ix_chat_message_user_id_timestamp', 'user_id', 'timestamp'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     message = db.Column(db.Text, nullable=False)
@@ -18,3 +21,14 @@ class ChatMessage(db.Model):
         return f'<ChatMessage {self.id} from User {self.user_id}>'
 
 
+class ChatSummary(db.Model):
+    """Rolling summary of the part of a user's dialogue that no longer fits the prompt window"""
+    __tablename__ = 'chat_summary'
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    summary = db.Column(db.Text, nullable=False, default='')
+    # Last ChatMessage.id already folded into the summary
+    last_message_id = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ChatSummary for User {self.user_id} up to {self.last_message_id}>'
@@ -10,6 +10,10 @@ class PetStatus(enum.Enum):
 
 class Pet(db.Model):
     __tablename__ = 'pet'
+    __table_args__ = (
+        # Category counts and keyset pagination of category members
+        db.Index('ix_pet_category_id_id', 'category_id', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     species = db.Column(db.String(50), nullable=False)
@@ -3,6 +3,10 @@ from app import db
 
 class Product(db.Model):
     __tablename__ = 'product'
+    __table_args__ = (
+        # Category counts and keyset pagination of category members
+        db.Index('ix_product_category_id_id', 'category_id', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.String(300))
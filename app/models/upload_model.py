@@ -0,0 +1,14 @@
+from datetime import datetime
+from app import db
+
+class UploadBlob(db.Model):
+    """Content-addressed upload (<sha256>.<ext>) shared by every row that references the same bytes"""
+    __tablename__ = 'upload_blob'
+    name = db.Column(db.String(80), primary_key=True)
+    size = db.Column(db.BigInteger, nullable=False)
+    refcount = db.Column(db.Integer, nullable=False, default=0)
+    # Last refcount change; unreferenced blobs are purged only after a grace period
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f'<UploadBlob {self.name} x{self.refcount}>'
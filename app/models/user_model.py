@@ -9,8 +9,15 @@ class Role(enum.Enum):
 
 class User(db.Model):
     __tablename__ = 'user'
+    __table_args__ = (
+        # Keyset pagination of admin listings filtered by role / ban status
+        db.Index('ix_user_role_id', 'role', 'id'),
+        db.Index('ix_user_isBanned_id', 'isBanned', 'id'),
+        # Username prefix search (LIKE 'abc%') regardless of the database collation
+        db.Index('ix_user_username_pattern', 'username', postgresql_ops={'username': 'varchar_pattern_ops'}),
+    )
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    username = db.Column(db.String(80), unique=False, nullable=False)
+    username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     password = db.Column(db.String(200), nullable=False)
     role = db.Column(db.Enum(Role), nullable=False, default=Role.CLIENT.value)
@@ -1,9 +1,14 @@
 from flask_restx import Namespace, Resource, fields
 from flask import request, jsonify
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, unset_jwt_cookies
-from sqlalchemy import func
-from .. import db, bcrypt
-from app.utils.role_utils import get_user_data_with_permissions
+from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity, get_jwt, decode_token, unset_jwt_cookies
+from sqlalchemy import or_
+from .. import db
+from app.utils.role_utils import get_user_data_with_permissions, permission_claims
+from app.utils.rate_limit import rate_limit
+from app.utils.user_cache import get_user_context
+from app.utils.revocation import revoke_token
+from app.config import Config
+from app.utils.password_hasher import hash_password, check_password, needs_rehash, PasswordPoolBusy
 from sqlalchemy.exc import IntegrityError
 import datetime
 import re
@@ -17,6 +22,10 @@ register_model = auth_ns.model('Register', {
     'password': fields.String(required=True, description='Пароль')
 })
 
+logout_model = auth_ns.model('Logout', {
+    'refresh_token': fields.String(description='Refresh-токен, который тоже нужно отозвать')
+})
+
 login_model = auth_ns.model('Login', {
     'email': fields.String(required=True, description='Электронная почта'),
     'password': fields.String(required=True, description='Пароль')
@@ -31,11 +40,46 @@ class Roles(Resource):
         roles = [role.value for role in Role]
         return {'user_model.py': roles}, 200
 
-def get_next_user_id():
-    max_id = db.session.query(func.max(User.id)).scalar()  # Получаем максимальный id
-    if max_id is None:  # Если пользователей нет, начинаем с 1
-        return 1
-    return max_id + 1  # Увеличиваем максимальный id на 1
+def issue_tokens(user):
+    """Короткоживущий access-токен и refresh-токен для обновления без пароля"""
+    identity = {
+        'id': user.id,
+        'username': user.username,
+        'role': user.role.value
+    }
+    access_token = create_access_token(
+        identity=identity,
+        additional_claims=permission_claims(user.role),
+        expires_delta=datetime.timedelta(minutes=Config.ACCESS_TOKEN_TTL_MINUTES)
+    )
+    refresh_token = create_refresh_token(
+        identity=identity,
+        expires_delta=datetime.timedelta(days=Config.REFRESH_TOKEN_TTL_DAYS)
+    )
+    return access_token, refresh_token
+
+EMAIL_TAKEN_MESSAGE = 'Email уже зарегистрирован.'
+USERNAME_TAKEN_MESSAGE = 'Имя пользователя занято.'
+
+def find_registration_conflict(email, username):
+    """Проверка занятости email и имени пользователя одним запросом"""
+    rows = db.session.query(User.email, User.username).filter(
+        or_(User.email == email, User.username == username)
+    ).limit(2).all()
+    if any(row.email == email for row in rows):
+        return EMAIL_TAKEN_MESSAGE
+    if rows:
+        return USERNAME_TAKEN_MESSAGE
+    return None
+
+def integrity_conflict_message(error):
+    """Какое ограничение уникальности нарушено (гонка между проверкой и вставкой)"""
+    text = str(getattr(error, 'orig', error)).lower()
+    if 'email' in text:
+        return EMAIL_TAKEN_MESSAGE
+    if 'username' in text:
+        return USERNAME_TAKEN_MESSAGE
+    return None
 
 @auth_ns.route('/register')
 class Register(Resource):
@@ -52,45 +96,47 @@ class Register(Resource):
         if not PASSWORD_REGEX.match(data['password']):
             return {'message': 'Пароль должен быть минимум 6 символов, содержать хотя бы одну букву и одну цифру.'}, 400
 
-        if User.query.filter_by(email=data['email']).first():
-            return {'message': 'Email уже зарегистрирован.'}, 400
-        if User.query.filter_by(username=data['username']).first():
-            return {'message': 'Имя пользователя занято.'}, 400
+        conflict = find_registration_conflict(data['email'], data['username'])
+        if conflict:
+            return {'message': conflict}, 400
 
-        # Генерация следующего уникального ID
-        new_user_id = get_next_user_id()
+        try:
+            password_hash = hash_password(data['password'])
+        except PasswordPoolBusy:
+            return {'message': 'Сервер перегружен, попробуйте позже.'}, 503, {'Retry-After': '1'}
 
+        # id выдаёт последовательность БД, уникальность гарантируют ограничения
         new_user = User(
-            id=new_user_id,  # Явно указываем id
             username=data['username'],
             email=data['email'],
-            password=bcrypt.generate_password_hash(data['password']).decode('utf-8'),
+            password=password_hash,
             role=Role.CLIENT.value
         )
 
         try:
             db.session.add(new_user)
             db.session.commit()
-        except IntegrityError:
+        except IntegrityError as e:
             db.session.rollback()
+            conflict = integrity_conflict_message(e)
+            if conflict:
+                return {'message': conflict}, 400
             return {'message': 'Ошибка базы данных: невозможно зарегистрировать пользователя.'}, 500
 
-        access_token = create_access_token(identity={
-            'id': new_user.id,
-            'username': new_user.username,
-            'role': new_user.role.value
-        }, expires_delta=datetime.timedelta(minutes=30))
+        access_token, refresh_token = issue_tokens(new_user)
 
         user_data = get_user_data_with_permissions(new_user)
 
         return {
             'message': 'Пользователь успешно зарегистрирован.',
             'access_token': access_token,
+            'refresh_token': refresh_token,
             'user': user_data
         }, 201
 
 @auth_ns.route('/login')
 class Login(Resource):
+    @rate_limit('login')
     @auth_ns.expect(login_model)
     def post(self):
         """Вход пользователя"""
@@ -109,28 +155,88 @@ class Login(Resource):
         if user.isBanned:
             return {'message': 'Ваш аккаунт заблокирован. Обратитесь в поддержку.'}, 403
 
-        if bcrypt.check_password_hash(user.password, data['password']):
-            access_token = create_access_token(identity={
-                'id': user.id,
-                'username': user.username,
-                'role': user.role.value
-            }, expires_delta=datetime.timedelta(minutes=30))
+        try:
+            password_ok = check_password(user.password, data['password'])
+        except PasswordPoolBusy:
+            return {'message': 'Сервер перегружен, попробуйте позже.'}, 503, {'Retry-After': '1'}
+
+        if password_ok:
+            # Прозрачное обновление хэша при смене BCRYPT_LOG_ROUNDS
+            if needs_rehash(user.password):
+                try:
+                    user.password = hash_password(data['password'])
+                    db.session.commit()
+                except PasswordPoolBusy:
+                    pass
+                except Exception:
+                    db.session.rollback()
+
+            access_token, refresh_token = issue_tokens(user)
 
             user_data = get_user_data_with_permissions(user)
 
             return {
                 'message': 'Вход выполнен успешно.',
                 'access_token': access_token,
+                'refresh_token': refresh_token,
                 'user': user_data
             }, 200
 
         return {'message': 'Неверный пароль.'}, 401
 
+@auth_ns.route('/refresh')
+class Refresh(Resource):
+    @jwt_required(refresh=True)
+    def post(self):
+        """Обновление токенов по refresh-токену (с ротацией, без проверки пароля)"""
+        identity = get_jwt_identity()
+        user = get_user_context(identity['id'])
+        if not user:
+            return {'message': 'Пользователь не найден.'}, 401
+        if user.isBanned:
+            return {'message': 'Ваш аккаунт заблокирован. Обратитесь в поддержку.'}, 403
+
+        # Использованный refresh-токен больше не действует; второй запрос с тем же токеном
+        # (даже параллельный) упирается в первичный ключ revoked_token
+        revoke_token(get_jwt())
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return {'message': 'Refresh-токен уже использован.'}, 401
+        except Exception:
+            db.session.rollback()
+            return {'message': 'Ошибка базы данных: не удалось обновить токен.'}, 500
+
+        # Роль берётся актуальная, а не из старого токена
+        access_token, refresh_token = issue_tokens(user)
+        return {
+            'access_token': access_token,
+            'refresh_token': refresh_token,
+            'user': user.data
+        }, 200
+
 @auth_ns.route('/logout')
 class Logout(Resource):
     @jwt_required()
+    @auth_ns.expect(logout_model)
     def post(self):
-        """Выход пользователя"""
+        """Выход пользователя: текущий access-токен (и переданный refresh-токен) отзываются"""
+        tokens = [get_jwt()]
+        data = request.get_json(silent=True) or {}
+        if data.get('refresh_token'):
+            try:
+                refresh_payload = decode_token(data['refresh_token'])
+                if refresh_payload['sub'] == get_jwt_identity():
+                    tokens.append(refresh_payload)
+            except Exception:
+                pass  # уже отозванный или недействительный токен — выходу не мешает
+        for payload in tokens:
+            revoke_token(payload)
+            try:
+                db.session.commit()
+            except IntegrityError:
+                db.session.rollback()  # уже отозван параллельным запросом
         response = jsonify({'message': 'Выход выполнен успешно.'})
         unset_jwt_cookies(response)
         return response
@@ -141,10 +247,10 @@ class VerifyToken(Resource):
     def get(self):
         """Проверка валидности токена"""
         identity = get_jwt_identity()
-        user = User.query.get(identity['id'])
+        user = get_user_context(identity['id'])
         if not user:
             return {'message': 'Пользователь не найден.'}, 404
         return {
             'message': 'Токен действителен.',
-            'user': get_user_data_with_permissions(user)
+            'user': user.data
         }, 200
\ No newline at end of file
@@ -1,11 +1,14 @@
 # app/routes/category_routes.py
-from flask_restx import Namespace, Resource, fields
-from flask import request
+from flask_restx import Namespace, Resource, fields, reqparse
+from flask import request, current_app
 from flask_jwt_extended import jwt_required
+from sqlalchemy import func
 from app.models.category_model import Category
+from app.models.product_model import Product
+from app.models.pet_model import Pet
 from .. import db
-from app.utils.util import role_required
-from app.models.user_model import Role
+from app.utils.util import permission_required
+from app.utils.catalog_cache import catalog_etag, catalog_cached
 
 category_ns = Namespace('categories', description='Operations related to product categories')
 
@@ -15,7 +18,12 @@ category_model = category_ns.model('Category', {
     'description': fields.String(description='Category description')
 })
 
-# Helper function
+# Query parameters for category member listings (keyset pagination)
+member_list_parser = reqparse.RequestParser()
+member_list_parser.add_argument('limit', type=int, location='args', help='Page size')
+member_list_parser.add_argument('after', type=int, location='args', help='Return members with id greater than this cursor')
+
+# Helper functions
 def format_category(category):
     return {
         'id': category.id,
@@ -23,18 +31,62 @@ def format_category(category):
         'description': category.description
     }
 
+def query_categories_with_counts(category_id=None):
+    """(Category, product_count, pet_count) rows; counts are grouped subqueries, not loaded relationships"""
+    product_counts = db.session.query(Product.category_id, func.count(Product.id).label('n')) \
+        .group_by(Product.category_id)
+    pet_counts = db.session.query(Pet.category_id, func.count(Pet.id).label('n')) \
+        .group_by(Pet.category_id)
+    if category_id is not None:
+        product_counts = product_counts.filter(Product.category_id == category_id)
+        pet_counts = pet_counts.filter(Pet.category_id == category_id)
+    product_counts = product_counts.subquery()
+    pet_counts = pet_counts.subquery()
+
+    query = db.session.query(
+        Category,
+        func.coalesce(product_counts.c.n, 0),
+        func.coalesce(pet_counts.c.n, 0)
+    ).outerjoin(product_counts, product_counts.c.category_id == Category.id) \
+     .outerjoin(pet_counts, pet_counts.c.category_id == Category.id)
+    if category_id is not None:
+        query = query.filter(Category.id == category_id)
+    return query.order_by(Category.id)
+
+def query_member_page(model, category_id, columns, key):
+    """One keyset page of a category's products or pets, selecting only the listed columns"""
+    args = member_list_parser.parse_args()
+    limit = args.get('limit') or current_app.config['CATEGORY_MEMBERS_PAGE_SIZE']
+    limit = max(1, min(limit, current_app.config['CATEGORY_MEMBERS_MAX_PAGE_SIZE']))
+
+    query = db.session.query(*[getattr(model, column) for column in columns]) \
+        .filter(model.category_id == category_id)
+    if args.get('after'):
+        query = query.filter(model.id > args['after'])
+    rows = query.order_by(model.id).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = rows[-1].id
+    return {key: [row._asdict() for row in rows], 'next_cursor': next_cursor}
+
 @category_ns.route('')
 class CategoryList(Resource):
+    @catalog_etag
+    @catalog_cached('categories')
     def get(self):
         """Get all categories (public)"""
         try:
-            categories = Category.query.all()
-            return [format_category(cat) for cat in categories], 200
+            return [
+                category.to_dict(product_count, pet_count)
+                for category, product_count, pet_count in query_categories_with_counts()
+            ], 200
         except Exception as e:
             return {'message': 'Failed to retrieve categories', 'error': str(e)}, 500
 
     @jwt_required()
-    @role_required(Role.ADMIN, Role.OWNER)
+    @permission_required('manage_categories')
     @category_ns.expect(category_model)
     def post(self):
         """Create a new category (Admin/Owner only)"""
@@ -59,18 +111,21 @@ class CategoryList(Resource):
 
 @category_ns.route('/<int:category_id>')
 class CategoryResource(Resource):
+    @catalog_etag
+    @catalog_cached('category:{category_id}')
     def get(self, category_id):
         """Get a single category (public)"""
         try:
-            category = Category.query.get_or_404(category_id)
-            return category.to_dict(), 200
+            row = query_categories_with_counts(category_id).first()
+            if row is None:
+                return {'message': 'Category not found'}, 404
+            category, product_count, pet_count = row
+            return category.to_dict(product_count, pet_count), 200
         except Exception as e:
             return {'message': 'Failed to retrieve category', 'error': str(e)}, 500
 
-
-
     @jwt_required()
-    @role_required(Role.ADMIN, Role.OWNER)
+    @permission_required('manage_categories')
     @category_ns.expect(category_model)
     def put(self, category_id):
         """Update a category (Admin/Owner only)"""
@@ -96,16 +151,46 @@ class CategoryResource(Resource):
             return {'message': 'Failed to update category', 'error': str(e)}, 500
 
     @jwt_required()
-    @role_required(Role.ADMIN, Role.OWNER)
+    @permission_required('manage_categories')
     def delete(self, category_id):
         """Delete a category (Admin/Owner only)"""
         try:
             category = Category.query.get_or_404(category_id)
-            if category.products or category.pets: # Check for associated products or pets
+            in_use = db.session.query(
+                db.session.query(Product.id).filter(Product.category_id == category_id).exists()
+            ).scalar() or db.session.query(
+                db.session.query(Pet.id).filter(Pet.category_id == category_id).exists()
+            ).scalar()
+            if in_use: # Check for associated products or pets
                 return {'message': 'Cannot delete category: It is associated with existing products or pets.'}, 400
             db.session.delete(category)
             db.session.commit()
             return {'message': 'Category deleted successfully'}, 200
         except Exception as e:
             db.session.rollback()
-            return {'message': 'Failed to delete category', 'error': str(e)}, 500
\ No newline at end of file
+            return {'message': 'Failed to delete category', 'error': str(e)}, 500
+
+@category_ns.route('/<int:category_id>/products')
+class CategoryProducts(Resource):
+    @category_ns.expect(member_list_parser)
+    @catalog_etag
+    @catalog_cached('category:{category_id}')
+    def get(self, category_id):
+        """Get products of a category (public, paginated)"""
+        if not db.session.query(Category.query.filter_by(id=category_id).exists()).scalar():
+            return {'message': 'Category not found'}, 404
+        page = query_member_page(Product, category_id, ('id', 'name', 'price'), 'products')
+        for product in page['products']:
+            product['price'] = float(product['price'])
+        return page, 200
+
+@category_ns.route('/<int:category_id>/pets')
+class CategoryPets(Resource):
+    @category_ns.expect(member_list_parser)
+    @catalog_etag
+    @catalog_cached('category:{category_id}')
+    def get(self, category_id):
+        """Get pets of a category (public, paginated)"""
+        if not db.session.query(Category.query.filter_by(id=category_id).exists()).scalar():
+            return {'message': 'Category not found'}, 404
+        return query_member_page(Pet, category_id, ('id', 'name', 'species'), 'pets'), 200
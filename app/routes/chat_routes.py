@@ -1,31 +1,29 @@
 from flask_restx import Namespace, Resource, fields, reqparse
-from flask import send_from_directory, current_app
+from flask import current_app
+from werkzeug.exceptions import NotFound
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from werkzeug.utils import secure_filename
-from openai import OpenAI
-from dotenv import load_dotenv
-import os
-import uuid
-import base64
 from datetime import datetime
 from app import db
-from app.models.chat_model import ChatMessage
+from app.models.chat_model import ChatMessage, ChatSummary
 from app.models.product_model import Product
 from app.models.pet_model import Pet, PetStatus
 from app.models.category_model import Category
+from app.utils import background, llm_client
+from app.utils.rate_limit import rate_limit
+from app.utils.uploads import send_upload
+from app.utils.upload_pipeline import upload_policy
+from app.utils.blob_storage import get_storage
+from app.utils.upload_store import save_upload, acquire_upload
+from app.utils.chat_images import is_image, prepare_vision_payload, load_vision_payload
+from app.utils.chat_documents import is_document, schedule_extraction, get_document_text, select_relevant_chunks
 import logging
+import threading
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Загрузка переменных окружения
-load_dotenv()
-api_key = os.getenv("OPENAI_API_KEY")
-
-# Инициализация клиента OpenAI
-client = OpenAI(api_key=api_key)
-
 # Пространство имён
 chat_ns = Namespace('chat', description='Chat with AI assistant')
 
@@ -49,6 +47,10 @@ chat_parser = reqparse.RequestParser()
 chat_parser.add_argument('message', type=str, required=True, help='User message cannot be blank')
 chat_parser.add_argument('file', type=reqparse.FileStorage, location='files')
 
+history_parser = reqparse.RequestParser()
+history_parser.add_argument('limit', type=int, location='args', help='Количество сообщений на странице')
+history_parser.add_argument('before', type=int, location='args', help='ID сообщения, до которого загружать историю (курсор)')
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
@@ -74,20 +76,122 @@ def extract_context(message):
 
     return context
 
+def clip_text(text, limit):
+    if not text:
+        return ''
+    return text if len(text) <= limit else text[:limit - 1] + '…'
+
+def format_turns(messages):
+    limit = current_app.config['CHAT_PROMPT_MESSAGE_CHARS']
+    return "".join(
+        f"Пользователь: {clip_text(msg.message, limit)}\nИИ: {clip_text(msg.reply, limit)}\n"
+        for msg in messages
+    )
+
+def get_unsummarized_messages(user_id, summary):
+    """Сообщения, ещё не свёрнутые в краткое содержание (новые первыми, не больше окна + пачки)"""
+    last_id = summary.last_message_id if summary else 0
+    limit = current_app.config['CHAT_PROMPT_WINDOW'] + current_app.config['CHAT_SUMMARY_BATCH']
+    return ChatMessage.query.filter(
+        ChatMessage.user_id == user_id,
+        ChatMessage.id > last_id
+    ).order_by(ChatMessage.timestamp.desc(), ChatMessage.id.desc()).limit(limit).all()
+
+def build_chat_history(user_id):
+    """История для промпта: краткое содержание старой части диалога + несвёрнутые сообщения дословно"""
+    summary = ChatSummary.query.get(user_id)
+    recent_messages = get_unsummarized_messages(user_id, summary)
+
+    chat_history = ""
+    if summary and summary.summary:
+        chat_history += f"\nКраткое содержание предыдущего диалога:\n{summary.summary}\n"
+    chat_history += "\nИстория диалога:\n" + format_turns(reversed(recent_messages))
+    return chat_history
+
+def update_chat_summary(user_id):
+    """Сворачивает вышедшие из окна сообщения в краткое содержание диалога.
+
+    Пока несвёрнутых сообщений меньше, чем окно + пачка, ничего не делает,
+    поэтому модель для конспекта вызывается раз в CHAT_SUMMARY_BATCH сообщений.
+    """
+    window = current_app.config['CHAT_PROMPT_WINDOW']
+    batch = current_app.config['CHAT_SUMMARY_BATCH']
+    summary = ChatSummary.query.get(user_id)
+    pending = get_unsummarized_messages(user_id, summary)
+    if len(pending) < window + batch:
+        return
+
+    to_fold = list(reversed(pending[window:]))
+    previous = summary.summary if summary and summary.summary else '(пусто)'
+    messages = [
+        {
+            "role": "system",
+            "content": (
+                "Ты ведёшь краткий конспект диалога пользователя с помощником зоомагазина. "
+                "Обнови конспект с учётом новых реплик: сохрани питомцев, интересующие товары, цены и договорённости. "
+                "Не более 5–7 предложений."
+            )
+        },
+        {
+            "role": "user",
+            "content": f"Текущий конспект:\n{previous}\n\nНовые реплики:\n{format_turns(to_fold)}"
+        }
+    ]
+    try:
+        new_summary = llm_client.complete(messages, max_tokens=300, temperature=0.2)
+    except Exception as e:
+        logger.error(f"Не удалось обновить конспект диалога пользователя {user_id}: {str(e)}")
+        return
+
+    if summary is None:
+        summary = ChatSummary(user_id=user_id)
+        db.session.add(summary)
+    summary.summary = clip_text(new_summary, current_app.config['CHAT_SUMMARY_MAX_CHARS'])
+    summary.last_message_id = to_fold[-1].id
+    try:
+        db.session.commit()
+        logger.info(f"Конспект диалога пользователя {user_id} обновлён до сообщения {summary.last_message_id}")
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Ошибка сохранения конспекта диалога: {str(e)}")
+
+_summaries_running = set()
+_summaries_lock = threading.Lock()
+
+def _update_chat_summary_in_background(app, user_id):
+    try:
+        with app.app_context():
+            update_chat_summary(user_id)
+    finally:
+        with _summaries_lock:
+            _summaries_running.discard(user_id)
+
+def schedule_summary_update(user_id):
+    """Обновить конспект в фоне, чтобы второй вызов модели не задерживал ответ на POST /chat.
+
+    Для пользователя идёт не больше одной задачи: сообщения, пришедшие во время неё, свернёт следующая.
+    """
+    with _summaries_lock:
+        if user_id in _summaries_running:
+            return
+        _summaries_running.add(user_id)
+    background.submit(_update_chat_summary_in_background, current_app._get_current_object(), user_id)
+
 def get_ai_reply(message, user_id, file_path=None):
     try:
         # Получение истории чата
-        recent_messages = ChatMessage.query.filter_by(user_id=user_id).order_by(
-            ChatMessage.timestamp.desc()
-        ).limit(5).all()
-
-        chat_history = "\nИстория диалога:\n"
-        for msg in reversed(recent_messages):
-            chat_history += f"Пользователь: {msg.message}\nИИ: {msg.reply}\n"
+        chat_history = build_chat_history(user_id)
 
         # Извлечение контекста
         context = extract_context(message)
 
+        # Текст прикреплённого документа: только релевантные фрагменты ограниченного размера
+        if file_path and is_document(file_path):
+            full_path = get_storage().local_copy(file_path)
+            document_text = get_document_text(full_path) if full_path else None
+            if document_text:
+                context += f"\n📄 Фрагменты прикреплённого документа:\n{select_relevant_chunks(document_text, message)}\n"
+
         messages = [
             {
                 "role": "system",
@@ -103,41 +207,36 @@ def get_ai_reply(message, user_id, file_path=None):
             }
         ]
 
-        # Обработка изображения, если файл изображение
-        if file_path and file_path.rsplit('.', 1)[1].lower() in {'png', 'jpg', 'jpeg', 'gif'}:
-            full_path = os.path.join(current_app.config['UPLOAD_FOLDER'], file_path)
-            if os.path.exists(full_path):
-                with open(full_path, "rb") as image_file:
-                    image_data = base64.b64encode(image_file.read()).decode('utf-8')
-                    messages.append({
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": message},
-                            {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image_data}"}}
-                        ]
-                    })
+        # Обработка изображения: используется заранее уменьшенная копия, оригинал не читается
+        if file_path and is_image(file_path):
+            full_path = get_storage().local_copy(file_path)
+            image_payload = load_vision_payload(full_path) if full_path else None
+            if image_payload:
+                messages.append({
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": message},
+                        {"type": "image_url", "image_url": {"url": image_payload}}
+                    ]
+                })
             else:
-                logger.error(f"Файл не найден: {full_path}")
-
-        # Запрос к OpenAI
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=messages,
-            max_tokens=200,
-            temperature=0.7
-        )
-        reply = response.choices[0].message.content.strip()
+                logger.error(f"Файл не найден: {file_path}")
+
+        # Запрос к модели
+        reply = llm_client.complete(messages, max_tokens=200, temperature=0.7)
         logger.info(f"AI ответ для пользователя {user_id}: {reply}")
         return reply
     except Exception as e:
-        logger.error(f"Ошибка OpenAI API: {str(e)}")
+        logger.error(f"Ошибка LLM API: {str(e)}")
         return "Извините, возникла ошибка. Попробуйте позже."
 
 @chat_ns.route('')
 class ChatMessageResource(Resource):
     @jwt_required()
+    @rate_limit('chat')
     @chat_ns.expect(chat_parser)
     @chat_ns.marshal_with(chat_response_model, code=201)
+    @upload_policy('chat')
     def post(self):
         user_identity = get_jwt_identity()
         user_id = user_identity['id']
@@ -145,20 +244,22 @@ class ChatMessageResource(Resource):
         user_message = args['message']
         file = args['file']
 
-        file_path = file_name = file_type = None
+        file_path = file_name = file_type = file_size = None
 
         # Обработка файла
         if file and file.filename and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            unique_name = f"{uuid.uuid4()}_{filename}"
-            upload_dir = current_app.config['UPLOAD_FOLDER']
-            os.makedirs(upload_dir, exist_ok=True)
-            full_path = os.path.join(upload_dir, unique_name)
-            file.save(full_path)
-            file_path = unique_name
-            file_name = filename
+            file_name = secure_filename(file.filename)
+            file_path, file_size = save_upload(file)
             file_type = file.content_type
+            full_path = get_storage().local_copy(file_path)
             logger.info(f"Файл загружен: {file_name} как {file_path}")
+            if is_image(file_path):
+                try:
+                    prepare_vision_payload(full_path)
+                except Exception as e:
+                    logger.warning(f"Не удалось подготовить изображение {file_path}: {str(e)}")
+            elif is_document(file_path):
+                schedule_extraction(full_path)
 
         # Ответ от ИИ
         ai_reply = get_ai_reply(user_message, user_id, file_path)
@@ -174,6 +275,7 @@ class ChatMessageResource(Resource):
         )
 
         try:
+            acquire_upload(file_path, file_size)
             db.session.add(new_msg)
             db.session.commit()
             logger.info(f"Сообщение сохранено, ID: {new_msg.id}")
@@ -182,6 +284,8 @@ class ChatMessageResource(Resource):
             logger.error(f"Ошибка базы данных: {str(e)}")
             return {'message': 'Ошибка при сохранении сообщения'}, 500
 
+        schedule_summary_update(user_id)
+
         result = {
             'id': new_msg.id,
             'message': new_msg.message,
@@ -200,13 +304,38 @@ class ChatMessageResource(Resource):
 @chat_ns.route('/history')
 class ChatHistoryResource(Resource):
     @jwt_required()
+    @chat_ns.expect(history_parser)
     @chat_ns.marshal_list_with(chat_response_model)
     def get(self):
+        """История чата постранично: от новых к старым, внутри страницы по времени.
+
+        Курсор следующей (более старой) страницы возвращается в заголовке X-Next-Cursor.
+        """
         user_identity = get_jwt_identity()
         user_id = user_identity['id']
-        messages = ChatMessage.query.filter_by(user_id=user_id).order_by(ChatMessage.timestamp).all()
+        args = history_parser.parse_args()
+        limit = args['limit'] or current_app.config['CHAT_HISTORY_PAGE_SIZE']
+        limit = max(1, min(limit, current_app.config['CHAT_HISTORY_MAX_PAGE_SIZE']))
+
+        query = ChatMessage.query.filter(ChatMessage.user_id == user_id)
+        if args['before']:
+            cursor = ChatMessage.query.filter_by(id=args['before'], user_id=user_id).first()
+            if not cursor:
+                chat_ns.abort(400, 'Недопустимый курсор')
+            query = query.filter(
+                db.tuple_(ChatMessage.timestamp, ChatMessage.id) < (cursor.timestamp, cursor.id)
+            )
+        messages = query.order_by(
+            ChatMessage.timestamp.desc(), ChatMessage.id.desc()
+        ).limit(limit + 1).all()
+
+        headers = {}
+        if len(messages) > limit:
+            messages = messages[:limit]
+            headers['X-Next-Cursor'] = str(messages[-1].id)
+
         result = []
-        for msg in messages:
+        for msg in reversed(messages):
             msg_data = {
                 'id': msg.id,
                 'message': msg.message,
@@ -222,14 +351,14 @@ class ChatHistoryResource(Resource):
             result.append(msg_data)
 
         logger.info(f"История чата для пользователя {user_id} — {len(result)} сообщений")
-        return result, 200
+        return result, 200, headers
 
 @chat_ns.route('/files/<path:filename>')
 class ChatFileResource(Resource):
     def get(self, filename):
-        file_path = os.path.join(os.path.abspath(current_app.config['UPLOAD_FOLDER']), filename)
-        if not os.path.exists(file_path):
-            logger.error(f"Файл не найден: {file_path}")
+        try:
+            # Вложения чата кэшируются только браузером, не общими прокси
+            return send_upload(filename, public=False)
+        except NotFound:
+            logger.error(f"Файл не найден: {filename}")
             return {'message': 'Файл не найден'}, 404
-        logger.info(f"Отдаётся файл: {filename}")
-        return send_from_directory(os.path.abspath(current_app.config['UPLOAD_FOLDER']), filename)
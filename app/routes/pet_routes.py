@@ -1,13 +1,15 @@
-from flask_restx import Namespace, Resource, fields, reqparse
-from flask import request, current_app
+from flask_restx import Namespace, Resource, fields, marshal, reqparse
+from flask import request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db
 from app.models.pet_model import Pet, PetStatus
-from app.utils.util import role_required
+from app.utils.util import role_required, permission_required, parse_fields, load_owners, owner_summary
+from app.utils.catalog_cache import catalog_etag, catalog_cached
+from app.utils.image_variants import schedule_presets
+from app.utils.upload_pipeline import upload_policy
+from app.utils.blob_storage import get_storage
+from app.utils.upload_store import save_upload, acquire_upload, release_upload
 import logging
-import os
-import uuid
-from werkzeug.utils import secure_filename
 from app.models.user_model import User, Role
 
 logging.basicConfig(level=logging.INFO)
@@ -36,6 +38,12 @@ pet_model = pet_ns.model('Pet', {
     }), allow_null=True)
 })
 
+PET_FIELDS = tuple(pet_model.keys())
+
+fields_parser = reqparse.RequestParser()
+fields_parser.add_argument('fields', type=str, location='args',
+                           help='Response fields, comma-separated, e.g. id,name,price,image_url')
+
 status_parser = reqparse.RequestParser()
 status_parser.add_argument('status', type=str, required=True, help='Pet status (AVAILABLE, RESERVED, SOLD)')
 status_parser.add_argument('owner_id', type=int, help='Owner ID for SOLD status')
@@ -56,26 +64,22 @@ owner_parser.add_argument('owner_id', type=int, help='User ID to set as owner')
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def format_pet(pet, for_vet=False):
-    owner = User.query.get(pet.owner_id) if pet.owner_id else None
-    result = {
-        'id': pet.id,
-        'name': pet.name,
-        'species': pet.species,
-        'breed': pet.breed,
-        'age': pet.age,
-        'description': pet.description,
-        'image_url': pet.image_url,
-        'seller_id': pet.seller_id,
-        'category_id': pet.category_id,
-        'status': pet.status,
-        'owner_id': pet.owner_id,
-        'owner': {'id': owner.id, 'username': owner.username} if owner else None
-    }
-    if not for_vet:
+def format_pet(pet, for_vet=False, field_names=PET_FIELDS, owners=None):
+    """pet — модель или строка из pet_columns(field_names); владелец ищется, только если запрошен owner"""
+    result = {field: getattr(pet, field) for field in field_names if field not in ('owner', 'price')}
+    if 'owner' in field_names:
+        result['owner'] = owner_summary(pet.owner_id, owners)
+    if 'price' in field_names and not for_vet:
         result['price'] = float(pet.price)
     return result
 
+def pet_columns(field_names):
+    """Колонки Pet для выбранных полей; id выбирается всегда (журнал ошибок), для owner нужен owner_id"""
+    names = set(field_names) | {'id'}
+    if 'owner' in names:
+        names.add('owner_id')
+    return [getattr(Pet, name) for name in PET_FIELDS if name in names and name != 'owner']
+
 def check_pet_authorization(pet, current_user_identity):
     current_user_id = current_user_identity['id']
     role_str = current_user_identity.get('role', '')
@@ -91,22 +95,30 @@ def check_pet_authorization(pet, current_user_identity):
 @pet_ns.route('')
 class PetList(Resource):
     @pet_ns.doc('list_pets')
-    @pet_ns.marshal_list_with(pet_model)
+    @pet_ns.expect(fields_parser)
+    @pet_ns.response(200, 'Success', [pet_model])
+    @catalog_etag
+    @catalog_cached('pets')
     def get(self):
         logger.debug("Entering get method for PetList")
         try:
-            pets = Pet.query.all()
+            field_names = parse_fields(fields_parser.parse_args()['fields'], PET_FIELDS)
+        except ValueError as e:
+            return {'message': str(e)}, 400
+        try:
+            pets = db.session.query(*pet_columns(field_names)).all()
             logger.debug(f"Retrieved {len(pets)} pets")
+            owners = load_owners(pet.owner_id for pet in pets) if 'owner' in field_names else None
             formatted_pets = []
             for pet in pets:
                 try:
-                    formatted_pet = format_pet(pet)
+                    formatted_pet = format_pet(pet, field_names=field_names, owners=owners)
                     formatted_pets.append(formatted_pet)
                 except Exception as e:
                     logger.warning(f"Failed to format pet ID {pet.id}: {str(e)}")
                     continue
             logger.debug("Formatted pets successfully")
-            return formatted_pets, 200
+            return marshal(formatted_pets, pet_model, mask=','.join(field_names)), 200
         except Exception as e:
             logger.exception(f"Error fetching pets: {str(e)}")
             return {'message': 'Ошибка получения питомцев', 'error': str(e)}, 500
@@ -116,6 +128,7 @@ class PetList(Resource):
     @pet_ns.expect(pet_parser)
     @pet_ns.doc('create_pet', security='BearerAuth')
     @pet_ns.marshal_with(pet_model, code=201)
+    @upload_policy('image')
     def post(self):
         current_user_identity = get_jwt_identity()
         logger.info(f"Request form data: {request.form}")
@@ -130,13 +143,10 @@ class PetList(Resource):
 
             image_url = None
             if image:
-                filename = secure_filename(image.filename)
-                unique_name = f"{uuid.uuid4().hex}_{filename}"
-                save_path = os.path.join(current_app.config['UPLOAD_FOLDER'], unique_name)
                 try:
-                    os.makedirs(current_app.config['UPLOAD_FOLDER'], exist_ok=True)
-                    image.save(save_path)
-                    image_url = unique_name
+                    image_url, image_size = save_upload(image)
+                    acquire_upload(image_url, image_size)
+                    schedule_presets(get_storage(), image_url)
                 except Exception as e:
                     logger.error(f"Failed to save image: {str(e)}")
                     return {'message': 'Не удалось сохранить изображение', 'error': str(e)}, 500
@@ -164,12 +174,22 @@ class PetList(Resource):
 @pet_ns.route('/<int:pet_id>')
 class PetResource(Resource):
     @pet_ns.doc('get_pet')
-    @pet_ns.marshal_with(pet_model)
+    @pet_ns.expect(fields_parser)
+    @pet_ns.response(200, 'Success', pet_model)
+    @catalog_etag
+    @catalog_cached('pet:{pet_id}')
     def get(self, pet_id):
         """Получить питомца по ID"""
         try:
-            pet = Pet.query.get_or_404(pet_id)
-            return format_pet(pet), 200
+            field_names = parse_fields(fields_parser.parse_args()['fields'], PET_FIELDS)
+        except ValueError as e:
+            return {'message': str(e)}, 400
+        try:
+            pet = db.session.query(*pet_columns(field_names)).filter(Pet.id == pet_id).first()
+            if pet is None:
+                return {'message': 'Питомец не найден'}, 404
+            data = format_pet(pet, field_names=field_names)
+            return marshal(data, pet_model, mask=','.join(field_names)), 200
         except Exception as e:
             return {'message': 'Ошибка получения питомца', 'error': str(e)}, 500
 
@@ -178,6 +198,7 @@ class PetResource(Resource):
     @pet_ns.expect(pet_parser)
     @pet_ns.doc('update_pet', security='BearerAuth')
     @pet_ns.marshal_with(pet_model)
+    @upload_policy('image')
     def put(self, pet_id):
         """Обновить питомца"""
         current_user_identity = get_jwt_identity()
@@ -201,19 +222,12 @@ class PetResource(Resource):
             if image and (image.filename == '' or not allowed_file(image.filename)):
                 return {'message': 'Недопустимый файл изображения. Допустимые расширения: png, jpg, jpeg, gif'}, 400
             if image:
-                if pet.image_url:
-                    old_path = os.path.join(current_app.config['UPLOAD_FOLDER'], pet.image_url.strip("/"))
-                    if os.path.exists(old_path):
-                        try:
-                            os.remove(old_path)
-                        except Exception:
-                            pass
-                filename = f"{uuid.uuid4().hex}_{secure_filename(image.filename)}"
-                upload_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-                os.makedirs(current_app.config['UPLOAD_FOLDER'], exist_ok=True)
                 try:
-                    image.save(upload_path)
-                    pet.image_url = filename
+                    image_url, image_size = save_upload(image)
+                    acquire_upload(image_url, image_size)
+                    release_upload(pet.image_url)
+                    pet.image_url = image_url
+                    schedule_presets(get_storage(), image_url)
                 except Exception as e:
                     return {'message': 'Не удалось сохранить изображение', 'error': str(e)}, 500
 
@@ -234,13 +248,7 @@ class PetResource(Resource):
             authorized, error_message = check_pet_authorization(pet, current_user_identity)
             if not authorized:
                 return {'message': error_message}, 403
-            if pet.image_url:
-                old_path = os.path.join(current_app.config['UPLOAD_FOLDER'], pet.image_url.strip("/"))
-                if os.path.exists(old_path):
-                    try:
-                        os.remove(old_path)
-                    except Exception:
-                        pass
+            release_upload(pet.image_url)
             db.session.delete(pet)
             db.session.commit()
             return {'message': 'Питомец успешно удалён'}, 200
@@ -259,7 +267,8 @@ class OwnedPets(Resource):
         current_user_id = current_user_identity['id']
         try:
             pets = Pet.query.filter_by(owner_id=current_user_id).all()
-            return [format_pet(p) for p in pets], 200
+            owners = load_owners([current_user_id])
+            return [format_pet(p, owners=owners) for p in pets], 200
         except Exception as e:
             logger.error(f"Ошибка получения питомцев владельца {current_user_id}: {e}")
             return {'message': 'Ошибка получения питомцев', 'error': str(e)}, 500
@@ -327,7 +336,7 @@ class PetOwner(Resource):
 @pet_ns.route('/<int:pet_id>/status')
 class PetStatusResource(Resource):
     @jwt_required()
-    @role_required(Role.ADMIN, Role.OWNER)
+    @permission_required('update_any_pet')
     @pet_ns.expect(status_parser)
     @pet_ns.doc('update_pet_status', security='BearerAuth')
     @pet_ns.marshal_with(pet_model)
@@ -1,11 +1,13 @@
-from flask_restx import Namespace, Resource, fields, reqparse
-from flask import request, current_app
+from flask_restx import Namespace, Resource, fields, marshal, reqparse
+from flask import request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models.relationship_model import  db
-from app.utils.util import role_required
-from werkzeug.utils import secure_filename
-import os
-import uuid
+from app.utils.util import role_required, parse_fields, load_owners, owner_summary
+from app.utils.catalog_cache import catalog_etag, catalog_cached
+from app.utils.image_variants import schedule_presets
+from app.utils.upload_pipeline import upload_policy
+from app.utils.blob_storage import get_storage
+from app.utils.upload_store import save_upload, acquire_upload, release_upload
 import logging
 from app.models.user_model import User, Role
 from app.models.product_model import Product
@@ -33,6 +35,13 @@ product_model = product_ns.model('Product', {
     }), allow_null=True)
 })
 
+PRODUCT_FIELDS = tuple(product_model.keys())
+
+# Sparse fieldset parser
+fields_parser = reqparse.RequestParser()
+fields_parser.add_argument('fields', type=str, location='args',
+                           help='Поля ответа через запятую, например id,name,price,image_url')
+
 # File upload parser
 product_parser = reqparse.RequestParser()
 product_parser.add_argument('name', type=str, required=False, help='Название продукта')
@@ -59,20 +68,19 @@ owner_parser.add_argument('owner_id', type=int, help='ID пользовател
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def format_product(product):
-    owner = User.query.get(product.owner_id) if product.owner_id else None
-    return {
-        'id': product.id,
-        'name': product.name,
-        'price': product.price,
-        'description': product.description,
-        'stock': product.stock,
-        'image_url': product.image_url,
-        'category_id': product.category_id,
-        'seller_id': product.seller_id,
-        'owner_id': product.owner_id,
-        'owner': {'id': owner.id, 'username': owner.username} if owner else None
-    }
+def format_product(product, field_names=PRODUCT_FIELDS, owners=None):
+    """product — модель или строка из product_columns(field_names); владелец ищется, только если запрошен owner"""
+    result = {field: getattr(product, field) for field in field_names if field != 'owner'}
+    if 'owner' in field_names:
+        result['owner'] = owner_summary(product.owner_id, owners)
+    return result
+
+def product_columns(field_names):
+    """Колонки Product для выбранных полей; для owner нужен owner_id"""
+    names = set(field_names)
+    if 'owner' in names:
+        names.add('owner_id')
+    return [getattr(Product, name) for name in PRODUCT_FIELDS if name in names and name != 'owner']
 
 def check_product_authorization(product, current_user_identity):
     current_user_id = current_user_identity['id']
@@ -91,13 +99,22 @@ def check_product_authorization(product, current_user_identity):
 @product_ns.route('')
 class ProductList(Resource):
     @product_ns.doc('list_products')
-    @product_ns.marshal_list_with(product_model)
+    @product_ns.expect(fields_parser)
+    @product_ns.response(200, 'Success', [product_model])
+    @catalog_etag
+    @catalog_cached('products')
     def get(self):
         """Получить все продукты"""
         try:
-            products = Product.query.all()
+            field_names = parse_fields(fields_parser.parse_args()['fields'], PRODUCT_FIELDS)
+        except ValueError as e:
+            return {'message': str(e)}, 400
+        try:
+            products = db.session.query(*product_columns(field_names)).all()
             logger.debug(f"Retrieved {len(products)} products")
-            return [format_product(p) for p in products], 200
+            owners = load_owners(p.owner_id for p in products) if 'owner' in field_names else None
+            data = [format_product(p, field_names, owners) for p in products]
+            return marshal(data, product_model, mask=','.join(field_names)), 200
         except Exception as e:
             logger.error(f"Ошибка получения продуктов: {str(e)}")
             return {'message': 'Ошибка получения продуктов', 'error': str(e)}, 500
@@ -107,6 +124,7 @@ class ProductList(Resource):
     @product_ns.expect(product_parser)
     @product_ns.doc('create_product', security='BearerAuth')
     @product_ns.marshal_with(product_model, code=201)
+    @upload_policy('image')
     def post(self):
         """Создать новый продукт"""
         current_user_identity = get_jwt_identity()
@@ -125,16 +143,11 @@ class ProductList(Resource):
 
             image_url = None
             if image:
-                filename = secure_filename(image.filename)
-                unique_name = f"{uuid.uuid4().hex}_{filename}"
-                # Используем абсолютный путь для UPLOAD_FOLDER
-                upload_folder = os.path.abspath(current_app.config['UPLOAD_FOLDER'])
-                save_path = os.path.join(upload_folder, unique_name)
                 try:
-                    os.makedirs(upload_folder, exist_ok=True)
-                    image.save(save_path)
-                    image_url = unique_name
-                    logger.info(f"Image saved successfully: {save_path}")
+                    image_url, image_size = save_upload(image)
+                    acquire_upload(image_url, image_size)
+                    schedule_presets(get_storage(), image_url)
+                    logger.info(f"Image saved successfully: {image_url}")
                 except Exception as e:
                     logger.error(f"Failed to save image: {str(e)}")
                     return {'message': 'Не удалось сохранить изображение', 'error': str(e)}, 500
@@ -160,12 +173,23 @@ class ProductList(Resource):
 @product_ns.route('/<int:product_id>')
 class ProductResource(Resource):
     @product_ns.doc('get_product')
-    @product_ns.marshal_with(product_model)
+    @product_ns.expect(fields_parser)
+    @product_ns.response(200, 'Success', product_model)
+    @catalog_etag
+    @catalog_cached('product:{product_id}')
     def get(self, product_id):
         """Получить продукт по ID"""
         try:
-            product = Product.query.get_or_404(product_id)
-            return format_product(product), 200
+            field_names = parse_fields(fields_parser.parse_args()['fields'], PRODUCT_FIELDS)
+        except ValueError as e:
+            return {'message': str(e)}, 400
+        try:
+            product = db.session.query(*product_columns(field_names)) \
+                .filter(Product.id == product_id).first()
+            if product is None:
+                return {'message': 'Продукт не найден'}, 404
+            data = format_product(product, field_names)
+            return marshal(data, product_model, mask=','.join(field_names)), 200
         except Exception as e:
             logger.error(f"Ошибка получения продукта {product_id}: {str(e)}")
             return {'message': 'Ошибка получения продукта', 'error': str(e)}, 500
@@ -175,6 +199,7 @@ class ProductResource(Resource):
     @product_ns.expect(product_json_parser, product_parser)
     @product_ns.doc('update_product', security='BearerAuth')
     @product_ns.marshal_with(product_model)
+    @upload_policy('image')
     def put(self, product_id):
         """Обновить продукт"""
         current_user_identity = get_jwt_identity()
@@ -195,23 +220,13 @@ class ProductResource(Resource):
                 if image and (image.filename == '' or not allowed_file(image.filename)):
                     return {'message': 'Недопустимый файл изображения. Допустимые расширения: png, jpg, jpeg, gif'}, 400
                 if image:
-                    if product.image_url:
-                        old_path = os.path.join(os.path.abspath(current_app.config['UPLOAD_FOLDER']), product.image_url.strip("/"))
-                        if os.path.exists(old_path):
-                            try:
-                                os.remove(old_path)
-                                logger.info(f"Old image deleted: {old_path}")
-                            except Exception:
-                                logger.warning(f"Failed to delete old image: {old_path}")
-                                pass
-                    filename = f"{uuid.uuid4().hex}_{secure_filename(image.filename)}"
-                    upload_folder = os.path.abspath(current_app.config['UPLOAD_FOLDER'])
-                    upload_path = os.path.join(upload_folder, filename)
                     try:
-                        os.makedirs(upload_folder, exist_ok=True)
-                        image.save(upload_path)
-                        product.image_url = filename
-                        logger.info(f"New image saved: {upload_path}")
+                        image_url, image_size = save_upload(image)
+                        acquire_upload(image_url, image_size)
+                        release_upload(product.image_url)
+                        product.image_url = image_url
+                        schedule_presets(get_storage(), image_url)
+                        logger.info(f"New image saved: {image_url}")
                     except Exception as e:
                         logger.error(f"Failed to save image: {str(e)}")
                         return {'message': 'Не удалось сохранить изображение', 'error': str(e)}, 500
@@ -261,15 +276,7 @@ class ProductResource(Resource):
             if not authorized:
                 return {'message': error_message}, 403
 
-            if product.image_url:
-                old_path = os.path.join(os.path.abspath(current_app.config['UPLOAD_FOLDER']), product.image_url.strip("/"))
-                if os.path.exists(old_path):
-                    try:
-                        os.remove(old_path)
-                        logger.info(f"Image deleted: {old_path}")
-                    except Exception:
-                        logger.warning(f"Failed to delete image: {old_path}")
-                        pass
+            release_upload(product.image_url)
 
             db.session.delete(product)
             db.session.commit()
@@ -292,7 +299,8 @@ class OwnedProducts(Resource):
         try:
             products = Product.query.filter_by(owner_id=current_user_id).all()
             logger.debug(f"Retrieved {len(products)} owned products for user {current_user_id}")
-            return [format_product(p) for p in products], 200
+            owners = load_owners([current_user_id])
+            return [format_product(p, owners=owners) for p in products], 200
         except Exception as e:
             logger.error(f"Ошибка получения продуктов владельца {current_user_id}: {str(e)}")
             return {'message': 'Ошибка получения продуктов', 'error': str(e)}, 500
@@ -1,10 +1,14 @@
 # app/routes/role_routes.py
 from flask_restx import Namespace, Resource, fields
 from flask import request, g
-from flask_jwt_extended import jwt_required
+from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models.user_model import User, Role
-from app.utils.role_utils import update_user_role, get_user_data_with_permissions
-from app.utils.util import role_required
+from app.utils.role_utils import update_user_role
+from app.utils.auth_middleware import token_required
+from app.utils.util import permission_required
+from .users_routes import (
+    user_list_parser, query_user_page, parse_user_ids, role_change_error, bulk_update_users
+)
 
 role_ns = Namespace('role', description='Operations related to user user_model.py')
 
@@ -15,18 +19,17 @@ role_update_model = role_ns.model('RoleUpdate', {
 
 @role_ns.route('/user/permissions')
 class UserPermissions(Resource):
-    @jwt_required()
+    @token_required
     def get(self):
         """Get current user permissions"""
         if not hasattr(g, 'user'):
             return {'message': 'Пользователь не аутентифицирован'}, 401
-        user_data = get_user_data_with_permissions(g.user)
-        return user_data, 200
+        return g.user.data, 200
 
 @role_ns.route('/user/<int:user_id>/role')
 class UserRole(Resource):
-    @jwt_required()
-    @role_required(Role.OWNER, Role.ADMIN)
+    @token_required
+    @permission_required('update_user')
     @role_ns.expect(role_update_model)
     def put(self, user_id):
         """Update user role"""
@@ -51,10 +54,47 @@ class UserRole(Resource):
             'user': updated_user
         }, 200
 
+bulk_role_update_model = role_ns.model('BulkRoleUpdate', {
+    'user_ids': fields.List(fields.Integer, required=True, description='IDs of the users to update'),
+    'role': fields.String(required=True, description='New role for the users')
+})
+
+@role_ns.route('/users/role')
+class BulkUserRole(Resource):
+    @jwt_required()
+    @permission_required('update_user')
+    @role_ns.expect(bulk_role_update_model)
+    def put(self):
+        """Update the role of several users at once"""
+        data = request.get_json(silent=True) or {}
+        try:
+            user_ids = parse_user_ids(data)
+        except ValueError as e:
+            return {'message': str(e)}, 400
+        try:
+            new_role = Role(str(data.get('role', '')).upper())
+        except ValueError:
+            return {'message': f'Недопустимая роль. Допустимые: {[r.value for r in Role]}'}, 400
+
+        identity = get_jwt_identity()
+        actor_id, actor_role = identity.get('id'), Role(identity['role'])
+        guard = None
+        if actor_role == Role.ADMIN:
+            guard = (User.id != actor_id) & User.role.notin_([Role.ADMIN, Role.OWNER])
+        elif new_role != Role.OWNER:
+            guard = User.id != actor_id
+
+        return bulk_update_users(
+            user_ids,
+            lambda user_id, role: role_change_error(actor_id, actor_role, user_id, role, new_role),
+            {User.role: new_role},
+            guard=guard
+        ), 200
+
 @role_ns.route('/roles')
 class RolesList(Resource):
     @jwt_required()
-    @role_required(Role.OWNER)
+    @permission_required('manage_roles')
     def get(self):
         """Get all available user_model.py"""
         roles = [role.value for role in Role]
@@ -63,15 +103,12 @@ class RolesList(Resource):
 @role_ns.route('/users/roles')
 class UsersWithRoles(Resource):
     @jwt_required()
-    @role_required(Role.OWNER, Role.ADMIN)
+    @permission_required('view_all_users')
+    @role_ns.expect(user_list_parser)
     def get(self):
-        """Get all users with their user_model.py"""
-        users = User.query.all()
-        result = [{
-            'id': user.id,
-            'username': user.username,
-            'email': user.email,
-            'role': user.role.value
-        } for user in users]
-        return {'users': result}, 200
+        """Get users with their roles (paginated)"""
+        try:
+            return query_user_page(user_list_parser.parse_args(), with_permissions=False), 200
+        except ValueError:
+            return {'message': f'Недопустимая роль. Допустимые: {[r.value for r in Role]}'}, 400
 
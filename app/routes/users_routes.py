@@ -1,12 +1,18 @@
 # app/routes/users_routes.py
-from flask_restx import Namespace, Resource, fields
-from flask import request
+import io
+from flask_restx import Namespace, Resource, fields, reqparse, inputs
+from werkzeug.datastructures import FileStorage
+from flask import request, current_app
+from sqlalchemy import or_, select, update
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from .auth_routes import PASSWORD_REGEX, EMAIL_REGEX
 from app.models.user_model import User, Role
-from .. import db, bcrypt
-from app.utils.util import role_required
-from app.utils.role_utils import get_user_data_with_permissions
+from .. import db
+from app.utils.util import role_required, permission_required
+from app.utils.role_utils import get_user_data_with_permissions, get_user_permissions
+from app.utils.password_hasher import hash_password, PasswordPoolBusy
+from app.utils.user_cache import invalidate_user
+from app.utils.user_import import import_users
 
 users_ns = Namespace('users', description='Operations related to users')
 
@@ -17,21 +23,159 @@ user_model = users_ns.model('User', {
     'password': fields.String(description='User password'),
     'role': fields.String(description='User role')
 })
+
+# Query parameters for user listings (keyset pagination + filters)
+user_list_parser = reqparse.RequestParser()
+user_list_parser.add_argument('limit', type=int, location='args', help='Page size')
+user_list_parser.add_argument('after', type=int, location='args', help='Return users with id greater than this cursor')
+user_list_parser.add_argument('role', type=str, location='args', help='Filter by role')
+user_list_parser.add_argument('isBanned', type=inputs.boolean, location='args', help='Filter by ban status')
+user_list_parser.add_argument('username', type=str, location='args', help='Filter by username prefix')
+
+def query_user_page(args, role=None, with_permissions=True):
+    """One page of users as plain rows: only the listed columns are selected, never password hashes.
+
+    Permissions are returned once per role present on the page instead of once per user.
+    Raises ValueError for an unknown role filter.
+    """
+    limit = args.get('limit') or current_app.config['USERS_PAGE_SIZE']
+    limit = max(1, min(limit, current_app.config['USERS_MAX_PAGE_SIZE']))
+
+    query = db.session.query(User.id, User.username, User.email, User.role, User.isBanned)
+    if role is None and args.get('role'):
+        role = Role(args['role'].upper())
+    if role is not None:
+        query = query.filter(User.role == role)
+    if args.get('isBanned') is not None:
+        query = query.filter(User.isBanned == args['isBanned'])
+    if args.get('username'):
+        prefix = args['username'].replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        query = query.filter(User.username.like(f'{prefix}%', escape='\\'))
+    if args.get('after'):
+        query = query.filter(User.id > args['after'])
+    rows = query.order_by(User.id).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = rows[-1].id
+
+    page = {
+        'users': [{
+            'id': row.id,
+            'username': row.username,
+            'email': row.email,
+            'role': row.role.value,
+            'isBanned': row.isBanned
+        } for row in rows],
+        'next_cursor': next_cursor
+    }
+    if with_permissions:
+        page['permissions'] = {row.role.value: get_user_permissions(row) for row in rows}
+    return page
+
+def role_change_error(actor_id, actor_role, target_id, target_role, new_role):
+    """Why the actor may not move the target from target_role to new_role, or None if allowed"""
+    if actor_role == Role.CLIENT:
+        return 'Clients cannot change user_model.py.'
+    if actor_role == Role.ADMIN:
+        if target_id == actor_id:
+            return 'Admins cannot change their own role.'
+        if target_role == Role.OWNER:
+            return "Admins cannot change an Owner's role."
+        if target_role == Role.ADMIN:
+            return 'Admins cannot change the role of other Admin users.'
+        if new_role in (Role.ADMIN, Role.OWNER):
+            return f'Admins cannot assign the {new_role.value.capitalize()} role to other users.'
+        return None
+    if actor_role == Role.OWNER:
+        if target_id == actor_id and new_role != Role.OWNER:
+            return 'Owners cannot change their own role to a non-Owner role.'
+        return None
+    return 'Permission denied for role change due to unrecognized current user role.'
+
+def ban_change_error(actor_id, actor_role, target_id, target_role):
+    """Why the actor may not ban or unban the target in a bulk request, or None if allowed"""
+    if target_id == actor_id:
+        return 'Вы не можете забанить самого себя'
+    if actor_role != Role.OWNER and target_role in (Role.ADMIN, Role.OWNER):
+        return 'Admins cannot ban or unban Owners or other Admin users.'
+    return None
+
+def parse_user_ids(data):
+    """Validated, de-duplicated user_ids from a bulk request body; raises ValueError"""
+    user_ids = data.get('user_ids') if isinstance(data, dict) else None
+    if not isinstance(user_ids, list) or not user_ids:
+        raise ValueError('user_ids must be a non-empty list')
+    if not all(isinstance(user_id, int) and not isinstance(user_id, bool) for user_id in user_ids):
+        raise ValueError('user_ids must contain integers only')
+    max_ids = current_app.config['USERS_BULK_MAX_IDS']
+    if len(user_ids) > max_ids:
+        raise ValueError(f'At most {max_ids} user_ids per request')
+    return list(dict.fromkeys(user_ids))
+
+def bulk_update_users(user_ids, check, values, guard=None):
+    """Apply `values` to every permitted user in one UPDATE and commit once.
+
+    `check(user_id, role)` returns an error message for users the actor may not
+    touch; `guard` is an extra WHERE clause repeating the rule in SQL, so a role
+    changed between the check and the UPDATE cannot slip through. Users the guard
+    skipped are reported as 'skipped', not 'updated'.
+    Returns per-user results in request order.
+    """
+    roles = dict(db.session.query(User.id, User.role).filter(User.id.in_(user_ids)).all())
+
+    results, allowed = [], []
+    for user_id in user_ids:
+        if user_id not in roles:
+            results.append({'id': user_id, 'status': 'not_found'})
+            continue
+        error = check(user_id, roles[user_id])
+        if error:
+            results.append({'id': user_id, 'status': 'forbidden', 'message': error})
+        else:
+            allowed.append(user_id)
+            results.append({'id': user_id, 'status': 'updated'})
+
+    updated_ids = set()
+    if allowed:
+        condition = User.id.in_(allowed)
+        if guard is not None:
+            condition = condition & guard
+        if db.session.get_bind().dialect.update_returning:
+            stmt = update(User).where(condition).values(values).returning(User.id)
+            updated_ids = set(db.session.execute(stmt, execution_options={'synchronize_session': False}).scalars())
+        else:
+            # Without RETURNING, lock the rows that pass the guard and update exactly those
+            updated_ids = set(db.session.execute(select(User.id).where(condition).with_for_update()).scalars())
+            if updated_ids:
+                db.session.execute(update(User).where(User.id.in_(updated_ids)).values(values),
+                                   execution_options={'synchronize_session': False})
+        db.session.commit()
+        if updated_ids:
+            invalidate_user(*updated_ids)
+
+    for result in results:
+        if result['status'] == 'updated' and result['id'] not in updated_ids:
+            result.update(status='skipped', message='User changed during the request; not updated.')
+
+    return {'results': results, 'updated': len(updated_ids)}
+
 @users_ns.route('/clients')
 class ClientList(Resource):
     @jwt_required()
-    @role_required( Role.ADMIN, Role.OWNER)
+    @permission_required('view_all_users')
+    @users_ns.expect(user_list_parser)
     def get(self):
-        """Get all clients"""
+        """Get clients (paginated)"""
         try:
-            clients = User.query.filter_by(role=Role.CLIENT).all()
-            return [get_user_data_with_permissions(c) for c in clients], 200
+            return query_user_page(user_list_parser.parse_args(), role=Role.CLIENT), 200
         except Exception as e:
             return {'message': 'Ошибка получения клиентов', 'error': str(e)}, 500
 @users_ns.route('')
 class UserList(Resource):
     @jwt_required()
-    @role_required(Role.ADMIN, Role.OWNER)
+    @permission_required('update_user')
     @users_ns.expect(user_model)
     def post(self):
         """Create a new user"""
@@ -46,8 +190,13 @@ class UserList(Resource):
                 return {'message': f'Missing required fields: {required_fields}'}, 400
 
 
-            if User.query.filter_by(email=data['email']).first():
+            taken = db.session.query(User.email, User.username).filter(
+                or_(User.email == data['email'], User.username == data['username'])
+            ).limit(2).all()
+            if any(row.email == data['email'] for row in taken):
                 return {'message': 'Email already taken'}, 400
+            if taken:
+                return {'message': 'Username already taken'}, 400
 
             # Валидация email
             if not EMAIL_REGEX.match(data['email']):
@@ -71,7 +220,7 @@ class UserList(Resource):
             new_user = User(
                 username=data['username'],
                 email=data['email'],
-                password=bcrypt.generate_password_hash(data['password']).decode('utf-8'),
+                password=hash_password(data['password']),
                 role=role
             )
 
@@ -83,16 +232,20 @@ class UserList(Resource):
                 'user': get_user_data_with_permissions(new_user)
             }, 201
 
+        except PasswordPoolBusy:
+            return {'message': 'Server is busy, try again later'}, 503, {'Retry-After': '1'}
         except Exception as e:
             db.session.rollback()
             return {'message': 'Error creating user', 'error': str(e)}, 500
 
-    @jwt_required()
-    @role_required(Role.ADMIN, Role.OWNER, Role.SELLER, Role.CLIENT)
+    @permission_required('view_all_users')
+    @users_ns.expect(user_list_parser)
     def get(self):
-        """Get all users"""
-        users = User.query.all()
-        return [get_user_data_with_permissions(u) for u in users], 200
+        """Get users (paginated, filterable by role, isBanned and username prefix)"""
+        try:
+            return query_user_page(user_list_parser.parse_args()), 200
+        except ValueError:
+            return {'message': f'Invalid role. Valid roles: {[r.value for r in Role]}'}, 400
 @users_ns.route('/<int:user_id>')
 class UserResource(Resource):
     @jwt_required()
@@ -152,29 +305,12 @@ class UserResource(Resource):
                 return {'message': f'Invalid role. Valid user_model.py: {[r.value for r in Role]}'}, 400
 
             if new_role_enum != user_to_update.role: # Actual role change requested
-                if current_user_role == Role.CLIENT:
-                    return {'message': 'Clients cannot change user_model.py.'}, 403
-
-                elif current_user_role == Role.ADMIN:
-                    if user_to_update.id == current_user_id_from_token:
-                        return {'message': 'Admins cannot change their own role.'}, 403
-                    if user_to_update.role == Role.OWNER:
-                        return {'message': "Admins cannot change an Owner's role."}, 403
-                    if user_to_update.role == Role.ADMIN:
-                        return {'message': 'Admins cannot change the role of other Admin users.'}, 403
-                    if new_role_enum == Role.ADMIN:
-                        return {'message': 'Admins cannot assign the Admin role to other users.'}, 403
-                    
-                    user_to_update.role = new_role_enum
-                    updated = True
-
-                elif current_user_role == Role.OWNER:
-                    if user_to_update.id == current_user_id_from_token and new_role_enum != Role.OWNER:
-                        return {'message': 'Owners cannot change their own role to a non-Owner role.'}, 403
-                    user_to_update.role = new_role_enum
-                    updated = True
-                else:
-                    return {'message': 'Permission denied for role change due to unrecognized current user role.'}, 403
+                error = role_change_error(current_user_id_from_token, current_user_role,
+                                          user_to_update.id, user_to_update.role, new_role_enum)
+                if error:
+                    return {'message': error}, 403
+                user_to_update.role = new_role_enum
+                updated = True
         
         # Final check for Client trying to update another user's profile (even if no role change was attempted)
         if current_user_role == Role.CLIENT and user_to_update.id != current_user_id_from_token:
@@ -184,6 +320,7 @@ class UserResource(Resource):
             return {'message': 'No valid fields to update or no changes made'}, 400
 
         db.session.commit()
+        invalidate_user(user_to_update.id)
         return {'message': 'User updated successfully', 'user': get_user_data_with_permissions(user_to_update)}, 200
 
     @jwt_required()
@@ -196,6 +333,7 @@ class UserResource(Resource):
         user = User.query.get_or_404(user_id)
         db.session.delete(user)
         db.session.commit()
+        invalidate_user(user_id)
         return {'message': 'User deleted successfully'}, 200
 # Swagger model для бана/разбана
 ban_model = users_ns.model('BanUser', {
@@ -205,7 +343,7 @@ ban_model = users_ns.model('BanUser', {
 @users_ns.route('/<int:user_id>/ban')
 class BanUser(Resource):
     @jwt_required()
-    @role_required(Role.ADMIN, Role.OWNER)
+    @permission_required('update_user')
     @users_ns.expect(ban_model)
     def put(self, user_id):
         """Забанить или разбанить пользователя"""
@@ -220,6 +358,70 @@ class BanUser(Resource):
 
         user.isBanned = data['isBanned']
         db.session.commit()
+        invalidate_user(user.id)
         # status = 'забанен' if user.isBanned else 'разбанен' # Old message
         return {'message': f'User ban status updated successfully', 'user': get_user_data_with_permissions(user)}, 200
 
+
+bulk_ban_model = users_ns.model('BulkBanUsers', {
+    'user_ids': fields.List(fields.Integer, required=True, description='IDs of the users to update'),
+    'isBanned': fields.Boolean(required=True, description='True чтобы забанить, False чтобы разбанить')
+})
+
+@users_ns.route('/ban')
+class BulkBanUsers(Resource):
+    @jwt_required()
+    @permission_required('update_user')
+    @users_ns.expect(bulk_ban_model)
+    def put(self):
+        """Забанить или разбанить нескольких пользователей одним запросом"""
+        data = request.get_json(silent=True) or {}
+        try:
+            user_ids = parse_user_ids(data)
+        except ValueError as e:
+            return {'message': str(e)}, 400
+        if not isinstance(data.get('isBanned'), bool):
+            return {'message': 'Поле isBanned обязательно'}, 400
+
+        identity = get_jwt_identity()
+        actor_id, actor_role = identity.get('id'), Role(identity['role'])
+        guard = User.id != actor_id
+        if actor_role != Role.OWNER:
+            guard = guard & User.role.notin_([Role.ADMIN, Role.OWNER])
+
+        return bulk_update_users(
+            user_ids,
+            lambda user_id, role: ban_change_error(actor_id, actor_role, user_id, role),
+            {User.isBanned: data['isBanned']},
+            guard=guard
+        ), 200
+
+import_parser = reqparse.RequestParser()
+import_parser.add_argument('file', type=FileStorage, location='files', required=True,
+                           help='CSV with username,email,password[,role] columns')
+import_parser.add_argument('batch_size', type=int, location='args', help='Rows per INSERT')
+
+@users_ns.route('/import')
+class UserImport(Resource):
+    @jwt_required()
+    @permission_required('update_user')
+    @users_ns.expect(import_parser)
+    def post(self):
+        """Import users from a CSV file (streamed, hashed in the password pool, inserted in batches)"""
+        args = import_parser.parse_args()
+        # Admins may onboard sellers and clients only, as with role changes
+        if Role(get_jwt_identity()['role']) == Role.OWNER:
+            allowed_roles = tuple(Role)
+        else:
+            allowed_roles = (Role.CLIENT, Role.SELLER)
+
+        lines = io.TextIOWrapper(args['file'].stream, encoding='utf-8-sig', newline='')
+        try:
+            report = import_users(lines, allowed_roles=allowed_roles, batch_size=args.get('batch_size'),
+                                  max_rows=current_app.config['USER_IMPORT_HTTP_MAX_ROWS'])
+        except ValueError as e:
+            return {'message': str(e)}, 400
+        except PasswordPoolBusy:
+            # Уже вставленные пачки остаются; при повторе они вернутся как ошибки дубликатов
+            return {'message': 'Server is busy, try again later'}, 503, {'Retry-After': '1'}
+        return report.to_dict(), 200
@@ -1,8 +1,7 @@
 from functools import wraps
-from flask import request, g, jsonify
+from flask import request, g
 from flask_jwt_extended import  jwt_required, get_jwt_identity
-from .role_utils import get_user_data_with_permissions
-from ..models.user_model import User
+from .user_cache import get_user_context
 
 
 def token_required(f):
@@ -10,11 +9,13 @@ def token_required(f):
     @jwt_required()
     def decorated(*args, **kwargs):
         identity = get_jwt_identity()
-        current_user = User.query.filter_by(id=identity['id']).first()
+        current_user = get_user_context(identity['id'])
         if not current_user:
-            return jsonify({'message': 'Пользователь не найден!'}), 401
+            return {'message': 'Пользователь не найден!'}, 401
+        if current_user.isBanned:
+            return {'message': 'Ваш аккаунт заблокирован. Обратитесь в поддержку.'}, 403
         g.user = current_user
-        g.user_permissions = get_user_data_with_permissions(current_user)['permissions']
+        g.user_permissions = current_user.data['permissions']
         return f(*args, **kwargs)
     return decorated
 
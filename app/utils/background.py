@@ -0,0 +1,22 @@
+# app/utils/background.py
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from app.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Общий пул фоновых задач процесса (извлечение текста, обработка файлов)
+_executor = ThreadPoolExecutor(max_workers=Config.BACKGROUND_WORKERS, thread_name_prefix='background')
+
+
+def _log_failure(future):
+    error = future.exception()
+    if error is not None:
+        logger.error(f"Ошибка фоновой задачи: {error!r}")
+
+
+def submit(fn, *args, **kwargs):
+    """Запустить fn в фоне; исключения логируются, Future возвращается вызывающему"""
+    future = _executor.submit(fn, *args, **kwargs)
+    future.add_done_callback(_log_failure)
+    return future
@@ -0,0 +1,212 @@
+# app/utils/blob_storage.py
+import logging
+import mimetypes
+import os
+import tempfile
+from flask import current_app
+from app.config import Config
+
+try:
+    import boto3
+    from botocore.exceptions import ClientError
+except ImportError:  # boto3 нужен только для UPLOAD_STORAGE=s3
+    boto3 = None
+    ClientError = Exception
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+CACHE_DIR = '.blobcache'  # локальные копии удалённых блобов (для превью, vision и извлечения текста)
+
+
+class LocalStorage:
+    """Загрузки в каталоге UPLOAD_FOLDER на диске этого узла"""
+    remote = False
+
+    def __init__(self, folder):
+        self.folder = os.path.abspath(folder)
+
+    def path(self, name):
+        return os.path.join(self.folder, name)
+
+    def stat(self, name):
+        """(размер, mtime) или None, если файла нет"""
+        try:
+            stat = os.stat(self.path(name))
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        return stat.st_size, stat.st_mtime
+
+    def put_file(self, name, tmp_path):
+        """Атомарно переместить готовый временный файл под имя name; False, если такой уже есть"""
+        path = self.path(name)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+            os.utime(path)  # свежий mtime защищает файл от очистки неиспользуемых блобов
+            return False
+        os.replace(tmp_path, path)
+        return True
+
+    def open(self, name, start=None, stop=None):
+        f = open(self.path(name), 'rb')
+        if start:
+            f.seek(start)
+        return f
+
+    def delete(self, name):
+        try:
+            os.remove(self.path(name))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def iter_files(self):
+        """(имя, размер, mtime) всех загрузок; служебные файлы с точкой пропускаются"""
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                if entry.name.startswith('.') or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                yield entry.name, stat.st_size, stat.st_mtime
+
+    def cached_path(self, name):
+        return self.path(name)
+
+    def local_copy(self, name):
+        path = self.path(name)
+        return path if os.path.exists(path) else None
+
+    def url(self, name):
+        return None
+
+
+class S3Storage:
+    """Загрузки в S3-совместимом хранилище (AWS S3, MinIO и т.п.), общем для всех узлов"""
+    remote = True
+
+    def __init__(self, client, bucket, prefix, cache_folder, presign_ttl):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.cache_folder = os.path.join(os.path.abspath(cache_folder), CACHE_DIR)
+        self.presign_ttl = presign_ttl
+
+    def _key(self, name):
+        return f'{self.prefix}{name}'
+
+    @staticmethod
+    def _content_type(name):
+        return mimetypes.guess_type(name)[0] or 'application/octet-stream'
+
+    def stat(self, name):
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=self._key(name))
+        except ClientError as e:
+            if _error_code(e) in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+        return head['ContentLength'], head['LastModified'].timestamp()
+
+    def put_file(self, name, tmp_path):
+        try:
+            if self.stat(name) is not None:
+                # Копия объекта в себя обновляет LastModified — как utime у локального хранилища
+                self.client.copy_object(Bucket=self.bucket, Key=self._key(name), MetadataDirective='REPLACE',
+                                        CopySource={'Bucket': self.bucket, 'Key': self._key(name)},
+                                        ContentType=self._content_type(name))
+                return False
+            content_type = self._content_type(name)
+            # upload_file читает файл частями и сам переходит на multipart для больших файлов
+            self.client.upload_file(tmp_path, self.bucket, self._key(name), ExtraArgs={'ContentType': content_type})
+            # Загруженный файл сразу становится локальной копией — превью и vision не скачивают его обратно
+            os.makedirs(self.cache_folder, exist_ok=True)
+            os.replace(tmp_path, self.cached_path(name))
+            return True
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def open(self, name, start=None, stop=None):
+        """Потоковое тело объекта (botocore StreamingBody); stop — не включая"""
+        params = {'Bucket': self.bucket, 'Key': self._key(name)}
+        if start is not None:
+            params['Range'] = f'bytes={start}-{"" if stop is None else stop - 1}'
+        return self.client.get_object(**params)['Body']
+
+    def delete(self, name):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(name))
+        try:
+            os.remove(self.cached_path(name))
+        except FileNotFoundError:
+            pass
+        return True
+
+    def iter_files(self):
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for item in page.get('Contents', []):
+                name = item['Key'][len(self.prefix):]
+                if name and '/' not in name and not name.startswith('.'):
+                    yield name, item['Size'], item['LastModified'].timestamp()
+
+    def cached_path(self, name):
+        return os.path.join(self.cache_folder, name)
+
+    def local_copy(self, name):
+        """Путь к копии объекта на локальном диске; скачивается при первом обращении"""
+        path = self.cached_path(name)
+        if os.path.exists(path):
+            return path
+        os.makedirs(self.cache_folder, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_folder, suffix='.tmp')
+        os.close(fd)
+        try:
+            self.client.download_file(self.bucket, self._key(name), tmp_path)
+        except ClientError as e:
+            os.remove(tmp_path)
+            if _error_code(e) in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+        os.replace(tmp_path, path)
+        return path
+
+    def url(self, name):
+        return self.client.generate_presigned_url(
+            'get_object', Params={'Bucket': self.bucket, 'Key': self._key(name)}, ExpiresIn=self.presign_ttl)
+
+
+def _error_code(error):
+    return str(getattr(error, 'response', {}).get('Error', {}).get('Code', ''))
+
+
+def _setting(config, name):
+    # Приложения, собранные без Config (бенчмарки, тесты), получают значения по умолчанию
+    return config.get(name, getattr(Config, name))
+
+
+def build_storage(config):
+    backend = _setting(config, 'UPLOAD_STORAGE')
+    if backend == 's3':
+        if boto3 is None:
+            raise RuntimeError('UPLOAD_STORAGE=s3 requires boto3')
+        client = boto3.client(
+            's3',
+            endpoint_url=_setting(config, 'S3_ENDPOINT_URL'),  # MinIO и другие S3-совместимые серверы
+            region_name=_setting(config, 'S3_REGION'),
+            aws_access_key_id=_setting(config, 'S3_ACCESS_KEY_ID'),
+            aws_secret_access_key=_setting(config, 'S3_SECRET_ACCESS_KEY')
+        )
+        bucket, prefix = _setting(config, 'S3_BUCKET'), _setting(config, 'S3_PREFIX')
+        logger.info(f"Хранилище загрузок: s3://{bucket}/{prefix}")
+        return S3Storage(client, bucket, prefix, config['UPLOAD_FOLDER'], _setting(config, 'S3_PRESIGN_TTL'))
+    if backend == 'local':
+        return LocalStorage(config['UPLOAD_FOLDER'])
+    raise ValueError(f'Unknown UPLOAD_STORAGE: {backend}')
+
+
+def get_storage():
+    """Хранилище загрузок текущего приложения (создаётся один раз)"""
+    storage = current_app.extensions.get('upload_storage')
+    if storage is None or (not storage.remote and storage.folder != os.path.abspath(current_app.config['UPLOAD_FOLDER'])):
+        storage = current_app.extensions['upload_storage'] = build_storage(current_app.config)
+    return storage
@@ -0,0 +1,406 @@
+# app/utils/catalog_cache.py
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from datetime import datetime
+from functools import wraps
+from urllib.parse import urlencode
+from flask import Response, copy_current_request_context, current_app, request
+from flask_restx.representations import output_json
+from flask_restx.utils import unpack
+from sqlalchemy import event, inspect, insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from werkzeug.http import quote_etag
+from app import db
+from app.models.catalog_model import CatalogVersion
+from app.models.category_model import Category
+from app.models.pet_model import Pet
+from app.models.product_model import Product
+from app.models.user_model import User
+from app.utils import background, metrics
+
+try:
+    import redis
+except ImportError:  # redis нужен только для CATALOG_CACHE_BACKEND=redis
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+CATALOG_MODELS = (Product, Pet, Category)
+VERSION_ROW = 1
+CATALOG_TAG = 'catalog'  # есть у каждой записи кэша; сбрасывает всё сразу (например, при смене имени владельца)
+
+
+def get_catalog_version():
+    """Текущая версия каталога (0, если строки счётчика ещё нет)"""
+    return db.session.query(CatalogVersion.version).filter(CatalogVersion.id == VERSION_ROW).scalar() or 0
+
+
+def ensure_catalog_version():
+    """Создать строку счётчика, если таблицу создал db.create_all, а не миграция"""
+    if db.session.get(CatalogVersion, VERSION_ROW) is not None:
+        return
+    try:
+        db.session.add(CatalogVersion(id=VERSION_ROW, version=0, updated_at=datetime.utcnow()))
+        db.session.commit()
+    except IntegrityError:  # строку успел создать другой воркер
+        db.session.rollback()
+
+
+def _entity_tags(obj):
+    """Теги кэша, которые задевает запись obj: список, сама запись и категории (счётчики, участники)"""
+    if isinstance(obj, Category):
+        return {'categories', f'category:{obj.id}'}
+    kind = 'product' if isinstance(obj, Product) else 'pet'
+    tags = {f'{kind}s', f'{kind}:{obj.id}', 'categories'}
+    history = inspect(obj).attrs.category_id.history
+    for category_id in (obj.category_id, *history.deleted):
+        if category_id:
+            tags.add(f'category:{category_id}')
+    return tags
+
+
+def _catalog_tags(session):
+    # Владелец (id, username) входит в ответы каталога, поэтому смена имени или удаление пользователя тоже считаются
+    tags = set()
+    for obj in session.new:
+        if isinstance(obj, CATALOG_MODELS):
+            tags |= _entity_tags(obj)
+    for obj in session.deleted:
+        if isinstance(obj, CATALOG_MODELS):
+            tags |= _entity_tags(obj)
+        elif isinstance(obj, User):
+            tags.add(CATALOG_TAG)
+    for obj in session.dirty:
+        if isinstance(obj, CATALOG_MODELS) and session.is_modified(obj, include_collections=False):
+            tags |= _entity_tags(obj)
+        elif isinstance(obj, User) and inspect(obj).attrs.username.history.has_changes():
+            tags.add(CATALOG_TAG)
+    return tags
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_catalog_tags(session, flush_context):
+    """Запомнить, какие товары, питомцы и категории задел flush; версия и кэш меняются после коммита"""
+    tags = _catalog_tags(session)
+    if tags:
+        session.info.setdefault('catalog_tags', set()).update(tags)
+
+
+def _bump_catalog_version(bind):
+    # Отдельная короткая транзакция после коммита записи: UPDATE внутри пишущей транзакции держал бы
+    # блокировку единственной строки счётчика до её коммита, и все записи каталога шли бы по очереди
+    table = CatalogVersion.__table__
+    now = datetime.utcnow()
+    try:
+        with bind.begin() as connection:
+            bumped = connection.execute(
+                update(table).where(table.c.id == VERSION_ROW).values(version=table.c.version + 1, updated_at=now)
+            ).rowcount
+            if not bumped:
+                connection.execute(insert(table).values(id=VERSION_ROW, version=1, updated_at=now))
+        metrics.inc('catalog.version_bumps')
+    except Exception as e:
+        logger.error(f"Ошибка обновления версии каталога: {str(e)}")
+
+
+@event.listens_for(Session, 'after_commit')
+def _catalog_committed(session):
+    # После отката теги не сбрасываются: откат мог быть лишь до точки сохранения, а лишняя инвалидация безвредна
+    tags = session.info.pop('catalog_tags', None)
+    if tags:
+        # Версия растёт только после коммита данных: прочитавший её запрос уже видит новые записи
+        _bump_catalog_version(session.get_bind(CatalogVersion))
+        invalidate(*tags)
+
+
+class MemoryGenerations:
+    """Поколения тегов в памяти процесса — инвалидации видит только этот воркер"""
+
+    def __init__(self):
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def get(self, tags):
+        return [self._generations.get(tag, 0) for tag in tags]
+
+    def bump(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+
+
+class SQLiteGenerations:
+    """Поколения тегов в файле SQLite — общие для всех воркеров на одной машине"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS catalog_cache_generation (tag TEXT PRIMARY KEY, generation INTEGER NOT NULL)'
+            )
+            self._local.connection = connection
+        return connection
+
+    def get(self, tags):
+        placeholders = ','.join('?' * len(tags))
+        rows = dict(self._connection().execute(
+            f'SELECT tag, generation FROM catalog_cache_generation WHERE tag IN ({placeholders})', tags
+        ).fetchall())
+        return [rows.get(tag, 0) for tag in tags]
+
+    def bump(self, tags):
+        self._connection().executemany(
+            'INSERT INTO catalog_cache_generation (tag, generation) VALUES (?, 1) '
+            'ON CONFLICT(tag) DO UPDATE SET generation = generation + 1',
+            [(tag,) for tag in tags]
+        )
+
+
+class RedisGenerations:
+    """Поколения тегов в Redis — общие для всех воркеров и машин"""
+
+    def __init__(self, url):
+        if redis is None:
+            raise RuntimeError('CATALOG_CACHE_BACKEND=redis requires the redis package')
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, tags):
+        return [int(value or 0) for value in self._client.mget([f'catalog:gen:{tag}' for tag in tags])]
+
+    def bump(self, tags):
+        pipeline = self._client.pipeline(transaction=False)
+        for tag in tags:
+            pipeline.incr(f'catalog:gen:{tag}')
+        pipeline.execute()
+
+
+CachedResponse = namedtuple('CachedResponse', 'generations version built_at body')
+
+
+class ResponseCache:
+    """LRU готовых тел ответов с ограничением по суммарному размеру.
+
+    Запись помнит поколения тегов и время сборки; свежая она или устаревшая, решает catalog_cached.
+    Записи старше max_age (TTL плюс окно stale-while-revalidate) удаляются при обращении.
+    """
+
+    def __init__(self, max_bytes, max_age):
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if now - entry.built_at > self.max_age:
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        size = len(entry.body) + len(key)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = entry
+            self.size += size
+            while self.size > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                metrics.inc('catalog_cache.evicted')
+
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        self.size -= len(entry.body) + len(key)
+
+
+_generations = None
+_responses = None
+_store_lock = threading.Lock()
+_inflight = {}  # (ключ, поколения) -> Future идущей сборки
+_inflight_lock = threading.Lock()
+
+
+def get_generations():
+    global _generations
+    if _generations is None:
+        with _store_lock:
+            if _generations is None:
+                config = current_app.config
+                backend = config['CATALOG_CACHE_BACKEND']
+                if backend == 'redis':
+                    _generations = RedisGenerations(config['CATALOG_CACHE_REDIS_URL'])
+                elif backend == 'sqlite':
+                    _generations = SQLiteGenerations(config['CATALOG_CACHE_SQLITE_PATH'])
+                elif backend == 'memory':
+                    _generations = MemoryGenerations()
+                else:
+                    raise ValueError(f'Неизвестное хранилище кэша каталога: {backend}')
+    return _generations
+
+
+def get_response_cache():
+    global _responses
+    if _responses is None:
+        with _store_lock:
+            if _responses is None:
+                config = current_app.config
+                _responses = ResponseCache(config['CATALOG_CACHE_MAX_BYTES'],
+                                           config['CATALOG_CACHE_TTL'] + config['CATALOG_CACHE_STALE_TTL'])
+                metrics.register_gauge('catalog_cache.bytes', lambda: _responses.size)
+    return _responses
+
+
+def invalidate(*tags):
+    """Сбросить записи кэша с этими тегами ('products', 'product:<id>', 'categories', 'category:<id>', ...)"""
+    try:
+        get_generations().bump(tags)
+        metrics.inc('catalog_cache.invalidations')
+    except Exception as e:
+        logger.error(f"Ошибка инвалидации кэша каталога: {str(e)}")
+
+
+def _json_response(entry):
+    # ETag — версия каталога, прочитанная до сборки именно этого тела (а не текущая):
+    # устаревшее тело из кэша не закрепится у клиента под новой версией
+    return Response(entry.body, status=200, mimetype='application/json',
+                    headers=_validator_headers(f'catalog-{entry.version}'))
+
+
+def _build(fn, args, kwargs, key, generations, flight):
+    """Собрать ответ и положить тело в кэш; результат получают и ждущие запросы (None — не 200)"""
+    entry = None
+    try:
+        version = get_catalog_version()
+        data, code, headers = unpack(fn(*args, **kwargs))
+        if code != 200:
+            return data, code, headers
+        response = output_json(data, code, headers)
+        response.mimetype = 'application/json'
+        entry = CachedResponse(generations, version, time.monotonic(), response.get_data())
+        get_response_cache().set(key, entry)
+        response.headers.update(_validator_headers(f'catalog-{version}'))
+        return response
+    finally:
+        flight.set_result(entry)
+        with _inflight_lock:
+            _inflight.pop((key, generations), None)
+
+
+def _start_flight(key, generations):
+    """Future сборки для (key, поколения) и признак того, что собирать должен вызывающий"""
+    with _inflight_lock:
+        flight = _inflight.get((key, generations))
+        if flight is not None:
+            return flight, False
+        flight = _inflight[(key, generations)] = Future()
+        return flight, True
+
+
+def catalog_cached(*tag_templates):
+    """Кэш готового ответа публичного GET по пути и параметрам запроса.
+
+    tag_templates — теги записи с параметрами маршрута, например 'product:{product_id}'.
+    Запись свежая, пока не старше CATALOG_CACHE_TTL и поколения её тегов не менялись; ответ,
+    собранный до коммита записи, сохраняется со старыми поколениями и свежим не считается.
+    Промах собирает один запрос на ключ, остальные ждут его результат (single-flight).
+    При CATALOG_CACHE_STALE_TTL > 0 устаревшая запись отдаётся сразу, а пересборка идёт в фоне.
+    Ставится над marshal_with (или над функцией, которая сама вызывает marshal) — в кэш
+    попадает уже сериализованное тело.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            config = current_app.config
+            if config['CATALOG_CACHE_TTL'] <= 0:
+                return fn(*args, **kwargs)
+            tags = [CATALOG_TAG] + [template.format(**kwargs) for template in tag_templates]
+            try:
+                generations = tuple(get_generations().get(tags))
+            except Exception as e:
+                # Кэш не должен ронять запросы: при сбое хранилища отвечаем без него
+                logger.error(f"Ошибка хранилища кэша каталога: {str(e)}")
+                return fn(*args, **kwargs)
+            key = f"{request.path}?{urlencode(sorted(request.args.items(multi=True)))}"
+
+            entry = get_response_cache().get(key)
+            if entry is not None:
+                age = time.monotonic() - entry.built_at
+                if entry.generations == generations and age <= config['CATALOG_CACHE_TTL']:
+                    metrics.inc('catalog_cache.hit')
+                    return _json_response(entry)
+                if config['CATALOG_CACHE_STALE_TTL'] > 0:
+                    # Stale-while-revalidate: читатель не ждёт, пересборку делает одна фоновая задача
+                    flight, leader = _start_flight(key, generations)
+                    if leader:
+                        rebuild = copy_current_request_context(_build)
+                        background.submit(rebuild, fn, args, kwargs, key, generations, flight)
+                    metrics.inc('catalog_cache.stale')
+                    return _json_response(entry)
+
+            metrics.inc('catalog_cache.miss')
+            flight, leader = _start_flight(key, generations)
+            if leader:
+                return _build(fn, args, kwargs, key, generations, flight)
+            try:
+                built = flight.result(timeout=config['CATALOG_CACHE_COALESCE_WAIT'])
+            except FutureTimeoutError:
+                built = None
+            if built is None:  # сборка не успела или ответила ошибкой — собираем сами, без кэша
+                return fn(*args, **kwargs)
+            metrics.inc('catalog_cache.coalesced')
+            return _json_response(built)
+        return wrapper
+    return decorator
+
+
+def _validator_headers(etag):
+    max_age = current_app.config['CATALOG_CACHE_MAX_AGE']
+    return {
+        'ETag': quote_etag(etag, weak=True),
+        'Cache-Control': f'public, max-age={max_age}, must-revalidate',
+    }
+
+
+def catalog_etag(fn):
+    """Слабый ETag из версии каталога для публичных GET.
+
+    Версия читается до основного запроса: If-None-Match с ней получает 304, не трогая товары и
+    не сериализуя их. Ставится над marshal_with (и catalog_cached), чтобы 304 не проходил через маршалинг.
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        etag = f'catalog-{get_catalog_version()}'
+        headers = _validator_headers(etag)
+        if request.if_none_match.contains_weak(etag):
+            metrics.inc('catalog.not_modified')
+            return Response(status=304, headers=headers)
+        result = fn(*args, **kwargs)
+        if isinstance(result, Response):
+            # Ответ из кэша уже подписан версией, с которой было собрано его тело
+            if result.status_code == 200 and 'ETag' not in result.headers:
+                result.headers.update(headers)
+            return result
+        data, code, extra = unpack(result)
+        if code == 200:
+            extra = {**(extra or {}), **headers}
+        return data, code, extra
+    return wrapper
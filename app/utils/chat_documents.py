@@ -0,0 +1,194 @@
+# app/utils/chat_documents.py
+import hashlib
+import logging
+import os
+import re
+import threading
+import zipfile
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from xml.etree import ElementTree
+from app.config import Config
+from app.utils import background
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # без pypdf PDF-вложения пропускаются
+    PdfReader = None
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_EXTENSIONS = {'txt', 'pdf', 'doc', 'docx'}
+EXTRACT_DIR = '.extracted'  # кэш извлечённого текста внутри UPLOAD_FOLDER, ключ — sha256 содержимого
+
+WORD_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+# Последовательности символов UTF-16LE (латиница и кириллица) в бинарном .doc
+DOC_TEXT_RUN = re.compile(rb'(?:[\x20-\x7e\r\n\t]\x00|[\x01-\x4f\x51]\x04){4,}')
+TOKEN = re.compile(r'\w{3,}')
+
+_pending = {}
+_pending_lock = threading.Lock()
+
+
+def is_document(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in DOCUMENT_EXTENSIONS
+
+
+def file_digest(full_path):
+    digest = hashlib.sha256()
+    with open(full_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _read_txt(full_path):
+    with open(full_path, 'rb') as f:
+        data = f.read(Config.DOC_EXTRACT_MAX_CHARS * 4)
+    for encoding in ('utf-8', 'cp1251'):
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return data.decode('utf-8', errors='ignore')
+
+
+def _read_docx(full_path):
+    """Текст абзацев .docx. Небольшой архив может распаковаться в огромный XML, поэтому размер
+    document.xml проверяется до чтения, а сам он разбирается потоково до DOC_EXTRACT_MAX_CHARS"""
+    paragraphs, runs, size = [], [], 0
+    with zipfile.ZipFile(full_path) as archive:
+        info = archive.getinfo('word/document.xml')
+        if info.file_size > Config.DOCX_MAX_XML_BYTES:
+            raise ValueError(f"word/document.xml распаковывается в {info.file_size} байт, лимит {Config.DOCX_MAX_XML_BYTES}")
+        # ZipExtFile не отдаёт больше заявленного file_size, даже если заголовок архива врёт
+        with archive.open(info) as xml:
+            for _, element in ElementTree.iterparse(xml):
+                if element.tag == f'{WORD_NS}t':
+                    runs.append(element.text or '')
+                elif element.tag == f'{WORD_NS}p':
+                    text = ''.join(runs)
+                    runs = []
+                    element.clear()
+                    if text:
+                        paragraphs.append(text)
+                        size += len(text)
+                        if size >= Config.DOC_EXTRACT_MAX_CHARS:
+                            break
+    return '\n'.join(paragraphs)
+
+
+def _read_pdf(full_path):
+    if PdfReader is None:
+        logger.warning("pypdf не установлен, текст PDF не извлекается")
+        return ''
+    pages = []
+    size = 0
+    for page in PdfReader(full_path).pages:
+        text = page.extract_text() or ''
+        pages.append(text)
+        size += len(text)
+        if size >= Config.DOC_EXTRACT_MAX_CHARS:
+            break
+    return '\n'.join(pages)
+
+
+def _read_doc(full_path):
+    """Старый бинарный .doc: вытаскиваем фрагменты UTF-16 текста (приближённо)"""
+    with open(full_path, 'rb') as f:
+        data = f.read()
+    return '\n'.join(run.decode('utf-16le', errors='ignore') for run in DOC_TEXT_RUN.findall(data))
+
+
+READERS = {'txt': _read_txt, 'docx': _read_docx, 'pdf': _read_pdf, 'doc': _read_doc}
+
+
+def _extract_cached(full_path):
+    """Текст документа: из кэша по хэшу содержимого, иначе извлекается и кэшируется"""
+    digest = file_digest(full_path)
+    cache_dir = os.path.join(os.path.dirname(full_path), EXTRACT_DIR)
+    cache_path = os.path.join(cache_dir, f'{digest}.txt')
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
+
+    extension = full_path.rsplit('.', 1)[1].lower()
+    text = READERS[extension](full_path)[:Config.DOC_EXTRACT_MAX_CHARS]
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f'{cache_path}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, cache_path)
+    logger.info(f"Извлечено {len(text)} символов из {os.path.basename(full_path)}")
+    return text
+
+
+def _forget(full_path):
+    with _pending_lock:
+        _pending.pop(full_path, None)
+
+
+def schedule_extraction(full_path):
+    """Запустить извлечение текста в фоне сразу после загрузки"""
+    with _pending_lock:
+        if full_path in _pending:
+            return
+        future = _pending[full_path] = background.submit(_extract_cached, full_path)
+    future.add_done_callback(lambda _: _forget(full_path))
+
+
+def get_document_text(full_path, timeout=None):
+    """Текст документа; ждёт фоновое извлечение не дольше timeout секунд"""
+    with _pending_lock:
+        future = _pending.get(full_path)
+    try:
+        if future is not None:
+            return future.result(timeout=Config.DOC_EXTRACT_WAIT if timeout is None else timeout)
+        return _extract_cached(full_path)
+    except FutureTimeoutError:
+        logger.warning(f"Извлечение текста {os.path.basename(full_path)} не завершилось вовремя")
+    except Exception as e:
+        logger.error(f"Не удалось извлечь текст {os.path.basename(full_path)}: {str(e)}")
+    return None
+
+
+def _chunks(text):
+    """Абзацы, склеенные в фрагменты не длиннее DOC_CHUNK_CHARS"""
+    size = Config.DOC_CHUNK_CHARS
+    chunk = ''
+    for paragraph in re.split(r'\n\s*\n|\n', text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        while len(paragraph) > size:
+            if chunk:
+                yield chunk
+                chunk = ''
+            yield paragraph[:size]
+            paragraph = paragraph[size:]
+        if chunk and len(chunk) + len(paragraph) + 1 > size:
+            yield chunk
+            chunk = ''
+        chunk = f'{chunk}\n{paragraph}' if chunk else paragraph
+    if chunk:
+        yield chunk
+
+
+def select_relevant_chunks(text, query):
+    """Фрагменты, больше всего пересекающиеся со словами запроса, в пределах DOC_CONTEXT_MAX_CHARS"""
+    budget = Config.DOC_CONTEXT_MAX_CHARS
+    query_tokens = set(TOKEN.findall(query.lower()))
+    chunks = list(_chunks(text))
+    scored = sorted(
+        range(len(chunks)),
+        key=lambda i: (-len(query_tokens & set(TOKEN.findall(chunks[i].lower()))), i)
+    )
+    selected = []
+    used = 0
+    for i in scored:
+        if used + len(chunks[i]) > budget:
+            continue
+        selected.append(i)
+        used += len(chunks[i])
+    return '\n...\n'.join(chunks[i] for i in sorted(selected))
@@ -0,0 +1,87 @@
+# app/utils/chat_images.py
+import base64
+import io
+import logging
+import os
+from app.config import Config
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow не установлен — отправляем оригинал с правильным типом
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+VISION_SUFFIX = '.vision'  # рядом с оригиналом хранится готовый data URL для vision-запроса
+
+MAGIC_MIME_TYPES = [
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+]
+
+
+def is_image(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in IMAGE_EXTENSIONS
+
+
+def sniff_mime_type(header):
+    """MIME-тип изображения по первым байтам файла"""
+    for magic, mime_type in MAGIC_MIME_TYPES:
+        if header.startswith(magic):
+            return mime_type
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+
+def _encode(data, mime_type):
+    return f"data:{mime_type};base64,{base64.b64encode(data).decode('ascii')}"
+
+
+def _downscale(full_path):
+    """Уменьшает изображение до CHAT_IMAGE_MAX_SIDE и пережимает: JPEG, либо PNG при прозрачности"""
+    with Image.open(full_path) as image:
+        image.seek(0)  # у GIF берём первый кадр
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((Config.CHAT_IMAGE_MAX_SIDE, Config.CHAT_IMAGE_MAX_SIDE))
+        has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+        buffer = io.BytesIO()
+        if has_alpha:
+            image.convert('RGBA').save(buffer, format='PNG', optimize=True)
+            return buffer.getvalue(), 'image/png'
+        image.convert('RGB').save(buffer, format='JPEG', quality=Config.CHAT_IMAGE_JPEG_QUALITY, optimize=True)
+        return buffer.getvalue(), 'image/jpeg'
+
+
+def prepare_vision_payload(full_path):
+    """Готовит и кэширует рядом с оригиналом компактный data URL для vision-запроса"""
+    payload = None
+    if Image is not None:
+        try:
+            payload = _encode(*_downscale(full_path))
+        except Exception as e:
+            logger.warning(f"Не удалось уменьшить изображение {full_path}: {str(e)}")
+    if payload is None:
+        with open(full_path, 'rb') as image_file:
+            data = image_file.read()
+        payload = _encode(data, sniff_mime_type(data[:16]) or 'image/jpeg')
+
+    tmp_path = full_path + VISION_SUFFIX + '.tmp'
+    with open(tmp_path, 'w', encoding='ascii') as cache_file:
+        cache_file.write(payload)
+    os.replace(tmp_path, full_path + VISION_SUFFIX)
+    return payload
+
+
+def load_vision_payload(full_path):
+    """Data URL из кэша; для старых загрузок без кэша он строится один раз"""
+    try:
+        with open(full_path + VISION_SUFFIX, 'r', encoding='ascii') as cache_file:
+            return cache_file.read()
+    except FileNotFoundError:
+        if not os.path.exists(full_path):
+            return None
+        return prepare_vision_payload(full_path)
@@ -0,0 +1,194 @@
+# app/utils/image_variants.py
+import io
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from app.config import Config
+from app.utils import background, metrics
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow не установлен — варианты не строятся, отдаётся оригинал
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+VARIANT_DIR = '.variants'  # кэш вариантов внутри UPLOAD_FOLDER; имена с точкой наружу напрямую не отдаются
+FORMATS = {'webp': ('WEBP', 'image/webp'), 'jpeg': ('JPEG', 'image/jpeg'), 'jpg': ('JPEG', 'image/jpeg'),
+           'png': ('PNG', 'image/png')}
+TOUCH_INTERVAL = 3600  # mtime варианта обновляется не чаще раза в час — по нему работает LRU
+EVICT_MIN_AGE = 60  # только что построенные варианты не вытесняются — их как раз отдают
+
+_locks = {}  # путь варианта -> [замок, сколько потоков его держат или ждут]
+_locks_guard = threading.Lock()
+_cache_bytes = None  # оценка размера кэша; считается сканированием один раз на процесс
+_cache_guard = threading.Lock()
+_evicting = False
+
+
+def snap(value):
+    """Ближайший разрешённый размер не меньше запрошенного (произвольные размеры не раздувают кэш)"""
+    if not value:
+        return None
+    sizes = Config.IMAGE_VARIANT_SIZES
+    return next((size for size in sizes if size >= value), sizes[-1])
+
+
+def normalize(width, height, fmt):
+    """(w, h, fmt) после привязки к сетке размеров; ValueError для неподдерживаемого формата"""
+    fmt = (fmt or '').lower() or None
+    if fmt is not None and fmt not in FORMATS:
+        raise ValueError(f'Unsupported format: {fmt}')
+    if fmt == 'jpg':
+        fmt = 'jpeg'
+    return snap(width), snap(height), fmt
+
+
+def variant_path(source_path, width, height, fmt):
+    folder = os.path.join(os.path.dirname(source_path), VARIANT_DIR)
+    name = os.path.basename(source_path)
+    return os.path.join(folder, f'{name}.{width or 0}x{height or 0}.{fmt or "auto"}')
+
+
+@contextmanager
+def _path_lock(path):
+    """Замок построения варианта; запись удаляется, только когда его никто не держит и не ждёт"""
+    with _locks_guard:
+        entry = _locks.get(path)
+        if entry is None:
+            entry = _locks[path] = [threading.Lock(), 0]
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _locks_guard:
+            entry[1] -= 1
+            if not entry[1]:
+                del _locks[path]
+
+
+def _render(source_path, width, height, fmt):
+    with Image.open(source_path) as image:
+        box = (width or height * 100, height or width * 100)
+        # JPEG декодируется сразу в уменьшенном масштабе — многомегабайтные фото не разворачиваются целиком
+        image.draft('RGB', box)
+        image.seek(0)  # у GIF берём первый кадр
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(box)
+        has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+        if fmt is None:
+            fmt = 'png' if has_alpha else 'jpeg'
+        pil_format, mime_type = FORMATS[fmt]
+        buffer = io.BytesIO()
+        if pil_format == 'JPEG':
+            image.convert('RGB').save(buffer, format='JPEG', quality=Config.IMAGE_VARIANT_QUALITY,
+                                      optimize=True, progressive=True)
+        elif pil_format == 'WEBP':
+            image.convert('RGBA' if has_alpha else 'RGB').save(buffer, format='WEBP',
+                                                                quality=Config.IMAGE_VARIANT_QUALITY, method=4)
+        else:
+            image.convert('RGBA' if has_alpha else 'RGB').save(buffer, format='PNG', optimize=True)
+        return buffer.getvalue()
+
+
+def get_variant(source_path, width, height, fmt):
+    """Путь к готовому варианту (строится при первом запросе) или None, если строить не из чего/нечем"""
+    if Image is None or not (width or height):
+        return None
+    path = variant_path(source_path, width, height, fmt)
+    try:
+        stat = os.stat(path)
+        if time.time() - stat.st_mtime > TOUCH_INTERVAL:
+            os.utime(path)
+        metrics.inc('image_variants.hit')
+        return path
+    except FileNotFoundError:
+        pass
+
+    # Один поток строит вариант, остальные запросы того же размера ждут его
+    with _path_lock(path):
+        if os.path.exists(path):
+            return path
+        started = time.perf_counter()
+        try:
+            data = _render(source_path, width, height, fmt)
+        except Exception as e:
+            logger.warning(f"Не удалось построить вариант {path}: {str(e)}")
+            return None
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        metrics.inc('image_variants.miss')
+        metrics.observe('image_variants.render', time.perf_counter() - started)
+    _account(os.path.dirname(path), len(data))
+    return path
+
+
+def _scan(folder):
+    entries = []
+    with os.scandir(folder) as it:
+        for entry in it:
+            if entry.is_file() and not entry.name.endswith('.tmp'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+    return entries
+
+
+def _account(folder, added):
+    global _cache_bytes, _evicting
+    with _cache_guard:
+        if _cache_bytes is None:
+            _cache_bytes = sum(size for _, size, _ in _scan(folder))
+        else:
+            _cache_bytes += added
+        if _cache_bytes <= Config.IMAGE_VARIANT_CACHE_MAX_BYTES or _evicting:
+            return
+        _evicting = True
+    background.submit(_evict, folder)
+
+
+def _evict(folder):
+    """Удаляет давно не запрошенные варианты, пока кэш не сожмётся до 90% лимита"""
+    global _cache_bytes, _evicting
+    try:
+        entries = sorted(_scan(folder))
+        total = sum(size for _, size, _ in entries)
+        target = Config.IMAGE_VARIANT_CACHE_MAX_BYTES * 0.9
+        removed = 0
+        fresh = time.time() - EVICT_MIN_AGE
+        for mtime, size, path in entries:
+            if total <= target or mtime > fresh:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        metrics.inc('image_variants.evicted', removed)
+        logger.info(f"Кэш вариантов изображений: удалено {removed}, осталось {total // 1024} КБ")
+        with _cache_guard:
+            _cache_bytes = total
+    finally:
+        with _cache_guard:
+            _evicting = False
+
+
+def pregenerate(storage, name):
+    source_path = storage.local_copy(name)
+    if source_path is None:
+        return
+    for width in Config.IMAGE_VARIANT_PRESETS:
+        for fmt in Config.IMAGE_VARIANT_PRESET_FORMATS:
+            get_variant(source_path, width, None, fmt)
+
+
+def schedule_presets(storage, name):
+    """Предварительно построить типовые размеры для витрины в фоновом потоке"""
+    if Image is not None:
+        background.submit(pregenerate, storage, name)
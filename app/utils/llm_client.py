@@ -0,0 +1,172 @@
+# app/utils/llm_client.py
+import hashlib
+import logging
+import os
+import threading
+import time
+from openai import OpenAI
+from app.config import Config
+from app.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+class OpenAIBackend:
+    """OpenAI или любой OpenAI-совместимый сервер (vLLM, llama.cpp, Ollama) через base_url"""
+
+    def __init__(self, api_key, model, base_url=None):
+        # Собственный таймаут и ограниченное число повторов вместо значений SDK по умолчанию
+        self.client = OpenAI(api_key=api_key, base_url=base_url,
+                             timeout=Config.LLM_TIMEOUT, max_retries=Config.LLM_MAX_RETRIES)
+        self.model = model
+
+    def complete(self, messages, max_tokens, temperature, timeout):
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            timeout=timeout
+        )
+        return response.choices[0].message.content.strip()
+
+
+class StubBackend:
+    """Детерминированная заглушка без сети: ответ зависит только от входа, задержка настраивается.
+
+    Нужна для нагрузочных тестов и CI, чтобы мерить собственные накладные расходы отдельно от модели.
+    """
+
+    def __init__(self, latency_ms=0):
+        self.latency = latency_ms / 1000.0
+
+    def complete(self, messages, max_tokens, temperature, timeout):
+        if self.latency:
+            if self.latency > timeout:
+                time.sleep(timeout)
+                raise TimeoutError('Заглушка LLM не уложилась в дедлайн')
+            time.sleep(self.latency)
+        last = messages[-1]['content']
+        if isinstance(last, list):
+            last = ' '.join(part.get('text', '') for part in last if part.get('type') == 'text')
+        digest = hashlib.sha1(repr(messages).encode('utf-8')).hexdigest()[:8]
+        tail = ' '.join(last.split()[-20:])
+        return f"[stub {digest}] {tail}".strip()
+
+
+def build_backend(config):
+    """Выбор провайдера по LLM_BACKEND: openai, local или stub"""
+    name = config.LLM_BACKEND.lower()
+    if name == 'stub':
+        return StubBackend(config.LLM_STUB_LATENCY_MS)
+    if name == 'local':
+        return OpenAIBackend(config.LLM_API_KEY or 'not-needed', config.LLM_MODEL, base_url=config.LLM_BASE_URL)
+    if name == 'openai':
+        return OpenAIBackend(os.getenv("OPENAI_API_KEY"), config.LLM_MODEL)
+    raise ValueError(f'Неизвестный LLM_BACKEND: {config.LLM_BACKEND}')
+
+
+backend = build_backend(Config)
+logger.info(f"LLM backend: {Config.LLM_BACKEND} ({Config.LLM_MODEL})")
+
+
+class LLMUnavailableError(Exception):
+    """Запрос к модели не выполнялся: размыкатель открыт или все слоты заняты"""
+
+
+class CircuitBreaker:
+    """Размыкатель цепи: после серии ошибок подряд отказывает сразу, не обращаясь к провайдеру.
+
+    closed -> open после failure_threshold ошибок подряд;
+    open -> half_open по истечении reset_timeout, пропускается один пробный вызов;
+    half_open -> closed при успехе пробного вызова, иначе снова open.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def cancel_trial(self):
+        """Разрешённый вызов так и не состоялся — пробный слот освобождается"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"Размыкатель LLM открыт после {self.failures} ошибок подряд")
+                    metrics.inc('llm.circuit_opened')
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+breaker = CircuitBreaker(Config.LLM_BREAKER_FAILURE_THRESHOLD, Config.LLM_BREAKER_RESET_TIMEOUT)
+_slots = threading.BoundedSemaphore(Config.LLM_MAX_CONCURRENCY)
+_in_flight = 0
+_in_flight_lock = threading.Lock()
+
+metrics.register_gauge('llm.circuit_state', lambda: breaker.state)
+metrics.register_gauge('llm.in_flight', lambda: _in_flight)
+
+
+def complete(messages, max_tokens=200, temperature=0.7):
+    """Текст ответа модели с дедлайном, ограничением параллелизма и размыкателем.
+
+    Если вызов не выполнялся, бросает LLMUnavailableError; ошибки провайдера пробрасываются как есть.
+    """
+    global _in_flight
+    if not breaker.allow():
+        metrics.inc('llm.rejected.circuit_open')
+        raise LLMUnavailableError('Размыкатель LLM открыт')
+    if not _slots.acquire(timeout=Config.LLM_QUEUE_TIMEOUT):
+        metrics.inc('llm.rejected.busy')
+        breaker.cancel_trial()
+        raise LLMUnavailableError('Все слоты LLM заняты')
+
+    with _in_flight_lock:
+        _in_flight += 1
+    started = time.perf_counter()
+    try:
+        reply = backend.complete(messages, max_tokens, temperature, Config.LLM_TIMEOUT)
+    except Exception:
+        metrics.inc('llm.errors')
+        breaker.record_failure()
+        raise
+    else:
+        breaker.record_success()
+        return reply
+    finally:
+        metrics.observe('llm.latency', time.perf_counter() - started)
+        with _in_flight_lock:
+            _in_flight -= 1
+        _slots.release()
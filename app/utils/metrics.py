@@ -0,0 +1,79 @@
+# app/utils/metrics.py
+import threading
+from collections import deque
+
+# Простой потокобезопасный реестр метрик процесса (каждый воркер gunicorn считает своё)
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_gauge_callbacks = {}
+_timings = {}
+
+TIMING_WINDOW = 500  # сколько последних замеров хранить для перцентилей
+
+
+def inc(name, value=1):
+    """Увеличить счётчик"""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def set_gauge(name, value):
+    """Установить текущее значение показателя"""
+    with _lock:
+        _gauges[name] = value
+
+
+def register_gauge(name, callback):
+    """Показатель, значение которого вычисляется в момент снятия метрик"""
+    with _lock:
+        _gauge_callbacks[name] = callback
+
+
+def observe(name, seconds):
+    """Записать длительность операции в секундах"""
+    with _lock:
+        timing = _timings.get(name)
+        if timing is None:
+            timing = _timings[name] = {'count': 0, 'sum': 0.0, 'max': 0.0, 'recent': deque(maxlen=TIMING_WINDOW)}
+        timing['count'] += 1
+        timing['sum'] += seconds
+        timing['max'] = max(timing['max'], seconds)
+        timing['recent'].append(seconds)
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    index = min(len(values) - 1, int(round(q * (len(values) - 1))))
+    return values[index]
+
+
+def snapshot():
+    """Снимок всех метрик в виде словаря, пригодного для JSON"""
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+        callbacks = dict(_gauge_callbacks)
+        timings = {name: (t['count'], t['sum'], t['max'], sorted(t['recent'])) for name, t in _timings.items()}
+
+    for name, callback in callbacks.items():
+        try:
+            gauges[name] = callback()
+        except Exception as e:
+            gauges[name] = f'error: {e}'
+
+    return {
+        'counters': counters,
+        'gauges': gauges,
+        'timings': {
+            name: {
+                'count': count,
+                'avg': total / count if count else None,
+                'max': maximum,
+                'p50': _percentile(recent, 0.5),
+                'p95': _percentile(recent, 0.95)
+            }
+            for name, (count, total, maximum, recent) in timings.items()
+        }
+    }
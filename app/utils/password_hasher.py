@@ -0,0 +1,133 @@
+# app/utils/password_hasher.py
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+import bcrypt
+from app.config import Config
+from app.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class PasswordPoolBusy(Exception):
+    """Очередь пула хэширования заполнена — запрос нужно отклонить (503)"""
+
+
+# Функции, выполняемые в процессах пула (совместимы с хэшами Flask-Bcrypt)
+def _hash(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _check(pw_hash, password):
+    try:
+        return bcrypt.checkpw(password.encode('utf-8'), pw_hash.encode('utf-8'))
+    except ValueError:  # повреждённый или не-bcrypt хэш
+        return False
+
+
+def pool_size():
+    return Config.PASSWORD_POOL_WORKERS or os.cpu_count() or 1
+
+
+_executor = None
+_executor_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(pool_size() + Config.PASSWORD_POOL_QUEUE)
+_pending = 0
+_pending_lock = threading.Lock()
+_batch_lock = threading.Lock()
+
+metrics.register_gauge('password_pool.size', pool_size)
+metrics.register_gauge('password_pool.pending', lambda: _pending)
+
+
+def _get_executor():
+    # Пул создаётся лениво, уже внутри воркера gunicorn, а не в мастер-процессе
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ProcessPoolExecutor(max_workers=pool_size())
+                logger.info(f"Пул хэширования паролей: {pool_size()} процессов")
+    return _executor
+
+
+def _run(name, fn, *args):
+    global _pending
+    started = time.perf_counter()
+    if not _slots.acquire(timeout=Config.PASSWORD_POOL_WAIT):
+        metrics.inc('password_pool.rejected')
+        raise PasswordPoolBusy('Пул хэширования паролей перегружен')
+    with _pending_lock:
+        _pending += 1
+    try:
+        return _get_executor().submit(fn, *args).result()
+    finally:
+        with _pending_lock:
+            _pending -= 1
+        _slots.release()
+        metrics.observe(f'password_pool.{name}', time.perf_counter() - started)
+
+
+def hash_password(password):
+    """bcrypt-хэш пароля с текущим BCRYPT_LOG_ROUNDS, вычисленный в пуле процессов"""
+    return _run('hash', _hash, password, Config.BCRYPT_LOG_ROUNDS)
+
+
+def check_password(pw_hash, password):
+    """Проверка пароля в пуле процессов"""
+    return _run('check', _check, pw_hash, password)
+
+
+def _acquire_slots(count):
+    # Под общим замком: два импорта не разберут семафор по частям и не зависнут
+    deadline = time.monotonic() + Config.PASSWORD_POOL_WAIT
+    acquired = 0
+    with _batch_lock:
+        try:
+            for _ in range(count):
+                if not _slots.acquire(timeout=max(deadline - time.monotonic(), 0)):
+                    metrics.inc('password_pool.rejected')
+                    raise PasswordPoolBusy('Пул хэширования паролей перегружен')
+                acquired += 1
+        except BaseException:
+            for _ in range(acquired):
+                _slots.release()
+            raise
+
+
+def hash_passwords(passwords):
+    """Хэширование пачки паролей для массового импорта.
+
+    Пачка уходит в пул кусками не больше pool_size(), и каждая задача куска занимает слот _slots,
+    как одиночный hash_password, — логины и регистрации ждут не дольше одного куска, а не всю пачку.
+    Слоты куска ждутся не дольше PASSWORD_POOL_WAIT, иначе — PasswordPoolBusy.
+    """
+    global _pending
+    started = time.perf_counter()
+    hashes = []
+    step = pool_size()
+    for start in range(0, len(passwords), step):
+        chunk = passwords[start:start + step]
+        # Слоты куска берутся под общим замком: два импорта не разберут семафор по частям и не зависнут
+        _acquire_slots(len(chunk))
+        with _pending_lock:
+            _pending += len(chunk)
+        try:
+            hashes.extend(_get_executor().map(_hash, chunk, [Config.BCRYPT_LOG_ROUNDS] * len(chunk)))
+        finally:
+            with _pending_lock:
+                _pending -= len(chunk)
+            for _ in chunk:
+                _slots.release()
+    metrics.observe('password_pool.hash_batch', time.perf_counter() - started)
+    return hashes
+
+
+def needs_rehash(pw_hash):
+    """True, если хэш посчитан с другой стоимостью, чем BCRYPT_LOG_ROUNDS"""
+    try:
+        return int(pw_hash.split('$')[2]) != Config.BCRYPT_LOG_ROUNDS
+    except (IndexError, ValueError):
+        return True
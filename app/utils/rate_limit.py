@@ -0,0 +1,147 @@
+# app/utils/rate_limit.py
+import logging
+import math
+import random
+import sqlite3
+import threading
+import time
+from functools import wraps
+from flask import current_app, request
+from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+from app.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+IDLE_SECONDS = 3600  # корзины, не трогавшиеся дольше, считаются полными и удаляются
+
+
+def parse_limit(limit):
+    """'10/60' -> (ёмкость 10, пополнение 10 токенов за 60 секунд)"""
+    capacity, period = limit.split('/')
+    capacity = float(capacity)
+    return capacity, capacity / float(period)
+
+
+def consume(tokens, updated_at, now, capacity, refill_rate):
+    """Пополнить корзину за прошедшее время и взять один токен.
+
+    Возвращает (оставшиеся токены, через сколько секунд появится токен; 0 — запрос разрешён).
+    """
+    tokens = min(capacity, tokens + max(0.0, now - updated_at) * refill_rate)
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) / refill_rate
+
+
+class MemoryBucketStore:
+    """Корзины в памяти процесса — по умолчанию, для одного воркера"""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, refill_rate):
+        now = time.time()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (capacity, now))
+            tokens, retry_after = consume(tokens, updated_at, now, capacity, refill_rate)
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > 10000:
+                self._buckets = {k: v for k, v in self._buckets.items() if now - v[1] < IDLE_SECONDS}
+        return retry_after
+
+
+class SQLiteBucketStore:
+    """Корзины в файле SQLite — общие для всех воркеров на одной машине"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS rate_limit_bucket ('
+                'key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)'
+            )
+            self._local.connection = connection
+        return connection
+
+    def take(self, key, capacity, refill_rate):
+        connection = self._connection()
+        now = time.time()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute(
+                'SELECT tokens, updated_at FROM rate_limit_bucket WHERE key = ?', (key,)
+            ).fetchone()
+            tokens, updated_at = row if row else (capacity, now)
+            tokens, retry_after = consume(tokens, updated_at, now, capacity, refill_rate)
+            connection.execute(
+                'INSERT INTO rate_limit_bucket (key, tokens, updated_at) VALUES (?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at',
+                (key, tokens, now)
+            )
+            if random.random() < 0.01:
+                connection.execute('DELETE FROM rate_limit_bucket WHERE updated_at < ?', (now - IDLE_SECONDS,))
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        return retry_after
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                backend = current_app.config['RATE_LIMIT_STORAGE']
+                if backend == 'sqlite':
+                    _store = SQLiteBucketStore(current_app.config['RATE_LIMIT_SQLITE_PATH'])
+                elif backend == 'memory':
+                    _store = MemoryBucketStore()
+                else:
+                    raise ValueError(f'Неизвестное хранилище лимитов: {backend}')
+    return _store
+
+
+def client_key():
+    """Идентификатор клиента: пользователь из JWT, иначе IP (за прокси нужен ProxyFix)"""
+    verify_jwt_in_request(optional=True)
+    identity = get_jwt_identity()
+    if identity:
+        return f"user:{identity['id']}"
+    return f"ip:{request.remote_addr}"
+
+
+def rate_limit(namespace):
+    """Ограничение частоты запросов корзиной токенов из RATE_LIMITS[namespace]; при превышении — 429"""
+    def wrapper(fn):
+        @wraps(fn)
+        def decorator(*args, **kwargs):
+            limit = current_app.config['RATE_LIMITS'].get(namespace)
+            if not limit:
+                return fn(*args, **kwargs)
+            capacity, refill_rate = parse_limit(limit)
+            key = f'{namespace}:{client_key()}'
+            try:
+                retry_after = get_store().take(key, capacity, refill_rate)
+            except Exception as e:
+                # Лимитер не должен ронять запросы: при сбое хранилища пропускаем
+                logger.error(f"Ошибка хранилища лимитов: {str(e)}")
+                return fn(*args, **kwargs)
+            if retry_after:
+                metrics.inc(f'rate_limit.rejected.{namespace}')
+                return {'message': 'Слишком много запросов. Попробуйте позже.'}, 429, \
+                    {'Retry-After': str(math.ceil(retry_after))}
+            return fn(*args, **kwargs)
+        return decorator
+    return wrapper
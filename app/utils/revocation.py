@@ -0,0 +1,144 @@
+# app/utils/revocation.py
+import hashlib
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from flask_jwt_extended.exceptions import (
+    CSRFError, FreshTokenRequired, JWTExtendedException, NoAuthorizationError, RevokedTokenError,
+    UserClaimsVerificationError, UserLookupError
+)
+from jwt.exceptions import ExpiredSignatureError, PyJWTError
+from app import db, jwt
+from app.config import Config
+from app.models.token_model import RevokedToken
+from app.utils import metrics
+from app.utils.user_cache import get_user_context
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """Фильтр Блума по jti: «нет» — точно не отозван, «да» — нужна проверка в БД"""
+
+    def __init__(self, size_bits, hashes):
+        self.size = size_bits
+        self.hashes = hashes
+        self.bits = bytearray((size_bits + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+_lock = threading.Lock()
+_bloom = BloomFilter(Config.REVOCATION_BLOOM_BITS, Config.REVOCATION_BLOOM_HASHES)
+_synced_until = None  # revoked_at последней загруженной записи
+_next_sync = 0.0
+_next_rebuild = 0.0
+
+
+def _sync():
+    """Подтянуть отзывы, сделанные другими воркерами; раз в час — перестроить фильтр без истёкших"""
+    global _bloom, _synced_until, _next_sync, _next_rebuild
+    now = time.monotonic()
+    if now < _next_sync:
+        return
+    with _lock:
+        if now < _next_sync:
+            return
+        _next_sync = now + Config.REVOCATION_SYNC_INTERVAL
+        query = db.session.query(RevokedToken.jti, RevokedToken.revoked_at)
+        if now >= _next_rebuild:
+            _next_rebuild = now + Config.REVOCATION_REBUILD_INTERVAL
+            utcnow = datetime.utcnow()
+            # Отдельное соединение, чтобы не коммитить сессию текущего запроса
+            with db.engine.begin() as connection:
+                connection.execute(RevokedToken.__table__.delete().where(RevokedToken.expires_at < utcnow))
+            bloom = BloomFilter(Config.REVOCATION_BLOOM_BITS, Config.REVOCATION_BLOOM_HASHES)
+            rows = query.filter(RevokedToken.expires_at >= utcnow).all()
+        else:
+            bloom = _bloom
+            # Перекрытие на случай транзакций, закоммиченных позже своего revoked_at
+            since = _synced_until - timedelta(seconds=60) if _synced_until else datetime.min
+            rows = query.filter(RevokedToken.revoked_at >= since).all()
+        for jti, revoked_at in rows:
+            bloom.add(jti)
+            if _synced_until is None or revoked_at > _synced_until:
+                _synced_until = revoked_at
+        _bloom = bloom
+
+
+def revoke_token(payload):
+    """Отозвать токен по его декодированному содержимому; коммит — на вызывающем.
+
+    Запись добавляется, а не сливается: если jti уже отозван (повторное использование refresh-токена,
+    в том числе двумя параллельными запросами), коммит упадёт с IntegrityError.
+    """
+    identity = payload.get('sub') or {}
+    db.session.add(RevokedToken(
+        jti=payload['jti'],
+        token_type=payload.get('type', 'access'),
+        user_id=identity.get('id') if isinstance(identity, dict) else None,
+        expires_at=datetime.utcfromtimestamp(payload['exp']),
+        revoked_at=datetime.utcnow()
+    ))
+    with _lock:
+        _bloom.add(payload['jti'])
+    metrics.inc('tokens.revoked')
+
+
+def is_token_revoked(payload):
+    """Проверка при каждом запросе: фильтр Блума, и лишь при совпадении — поиск по PK"""
+    identity = payload.get('sub')
+    if isinstance(identity, dict):
+        user = get_user_context(identity['id'])
+        if user is None or user.isBanned:
+            return True
+
+    _sync()
+    jti = payload['jti']
+    if jti not in _bloom:
+        return False
+    metrics.inc('tokens.bloom_positive')
+    return RevokedToken.query.get(jti) is not None
+
+
+def setup_token_revocation(app):
+    @jwt.token_in_blocklist_loader
+    def check_if_token_revoked(jwt_header, jwt_payload):
+        return is_token_revoked(jwt_payload)
+
+
+# Ответы как у обработчиков flask-jwt-extended; остальные ошибки токена — 422
+_JWT_ERRORS = (
+    (ExpiredSignatureError, 401, 'Token has expired'),
+    (RevokedTokenError, 401, 'Token has been revoked'),
+    (FreshTokenRequired, 401, 'Fresh token required'),
+    (UserClaimsVerificationError, 400, 'User claims verification failed'),
+    (UserLookupError, 401, 'Error loading the user'),
+    ((NoAuthorizationError, CSRFError), 401, None),
+)
+
+
+def setup_jwt_errors(api):
+    """Ошибки JWT внутри ресурсов перехватывает сам restx Api, минуя обработчики flask-jwt-extended"""
+    @api.errorhandler(JWTExtendedException)
+    @api.errorhandler(PyJWTError)
+    def handle_jwt_error(error):
+        code, message = 422, str(error)
+        for error_types, error_code, error_message in _JWT_ERRORS:
+            if isinstance(error, error_types):
+                code, message = error_code, error_message or str(error)
+                break
+        return {current_app.config['JWT_ERROR_MESSAGE_KEY']: message, 'message': message}, code
@@ -51,24 +51,50 @@ ROLE_PERMISSIONS = {
     }
 }
 
+DEFAULT_PERMISSIONS = {
+    'interface_sections': ['login', 'register', 'products', 'pets'],
+    'actions': ['view_products', 'view_pets']
+}
+
+# Compiled once at import: frozensets for membership checks, bit masks for the JWT claim.
+# Bits follow the sorted action names; tokens are short-lived, so renumbering after
+# adding an action only affects tokens issued before the deploy.
+ALL_ACTIONS = sorted({action for perms in ROLE_PERMISSIONS.values() for action in perms['actions']})
+ACTION_BITS = {action: 1 << i for i, action in enumerate(ALL_ACTIONS)}
+ROLE_SECTION_SETS = {role: frozenset(perms['interface_sections']) for role, perms in ROLE_PERMISSIONS.items()}
+ROLE_ACTION_SETS = {role: frozenset(perms['actions']) for role, perms in ROLE_PERMISSIONS.items()}
+ROLE_ACTION_MASKS = {
+    role: sum(ACTION_BITS[action] for action in actions) for role, actions in ROLE_ACTION_SETS.items()
+}
+DEFAULT_SECTION_SET = frozenset(DEFAULT_PERMISSIONS['interface_sections'])
+DEFAULT_ACTION_SET = frozenset(DEFAULT_PERMISSIONS['actions'])
+
 def get_user_permissions(user):
     """Get user permissions based on their role"""
     if not user or not user.role:
-        return {
-            'interface_sections': ['login', 'register', 'products', 'pets'],
-            'actions': ['view_products', 'view_pets']
-        }
+        return DEFAULT_PERMISSIONS
     return ROLE_PERMISSIONS.get(user.role, ROLE_PERMISSIONS[Role.CLIENT])
 
 def can_access_section(user, section):
     """Check if user can access a specific interface section"""
-    permissions = get_user_permissions(user)
-    return section in permissions['interface_sections']
+    if not user or not user.role:
+        return section in DEFAULT_SECTION_SET
+    return section in ROLE_SECTION_SETS.get(user.role, ROLE_SECTION_SETS[Role.CLIENT])
 
 def can_perform_action(user, action):
     """Check if user can perform a specific action"""
-    permissions = get_user_permissions(user)
-    return action in permissions['actions']
+    if not user or not user.role:
+        return action in DEFAULT_ACTION_SET
+    return action in ROLE_ACTION_SETS.get(user.role, ROLE_ACTION_SETS[Role.CLIENT])
+
+def permission_claims(role):
+    """Compact permissions claim for the access token: bit mask of allowed actions"""
+    return {'perms': ROLE_ACTION_MASKS.get(role, ROLE_ACTION_MASKS[Role.CLIENT])}
+
+def claims_allow(claims, action):
+    """Check an action against the 'perms' claim of a decoded token, without any lookups"""
+    bit = ACTION_BITS.get(action)
+    return bit is not None and bool(claims.get('perms', 0) & bit)
 
 def get_user_data_with_permissions(user):
     """Return user data with their permissions"""
@@ -95,4 +121,6 @@ def update_user_role(user_id, new_role):
         return None, f'Недопустимая роль: {new_role}'
     user.role = role
     db.session.commit()
+    from .user_cache import invalidate_user
+    invalidate_user(user.id)
     return get_user_data_with_permissions(user), None
\ No newline at end of file
@@ -0,0 +1,180 @@
+# app/utils/upload_gc.py
+import logging
+import os
+import threading
+import time
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from app import db
+from app.models.product_model import Product
+from app.models.pet_model import Pet
+from app.models.chat_model import ChatMessage
+from app.models.upload_model import UploadBlob
+from app.utils import metrics
+from app.utils.blob_storage import get_storage
+from app.utils.chat_documents import EXTRACT_DIR
+from app.utils.image_variants import VARIANT_DIR
+from app.utils.upload_pipeline import INCOMING_DIR
+from app.utils.upload_store import purge_unreferenced, SIDECAR_SUFFIXES
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокировки нет, сборщик запускается в каждом процессе
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+LOCK_FILE = '.gc.lock'
+
+
+def _referenced(names):
+    """Имена из пачки, на которые ссылается хоть одна строка (или которые учитывает upload_blob)"""
+    candidates = list(names) + ['/' + name for name in names]  # старые строки хранят путь со слэшем
+    referenced = set()
+    for column in (Product.image_url, Pet.image_url, ChatMessage.file_path):
+        referenced.update(value.strip('/') for (value,) in
+                          db.session.query(column).filter(column.in_(candidates)).distinct())
+    # Блобы с нулём ссылок удаляет purge_unreferenced со своим грейс-периодом
+    referenced.update(name for (name,) in db.session.query(UploadBlob.name).filter(UploadBlob.name.in_(names)))
+    db.session.rollback()  # не держим открытую транзакцию между пачками
+    return referenced
+
+
+def _remove(path, report, dry_run):
+    try:
+        size = os.path.getsize(path)
+        if not dry_run:
+            os.remove(path)
+    except FileNotFoundError:
+        return
+    report['removed'] += 1
+    report['bytes'] += size
+
+
+def _sweep_derived(folder, subdir, source_of, cutoff, report, dry_run):
+    """Файлы в служебной папке, оригинал которых уже удалён (или недописанные загрузки)"""
+    path = os.path.join(folder, subdir)
+    if not os.path.isdir(path):
+        return
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if not entry.is_file() or entry.stat().st_mtime > cutoff:
+                continue
+            source = source_of(entry.name)
+            if source is None or not os.path.exists(os.path.join(folder, source)):
+                _remove(entry.path, report, dry_run)
+
+
+def sweep(grace_seconds=None, batch_size=None, dry_run=False):
+    """Удалить из хранилища загрузки, на которые не ссылается ни одна строка БД.
+
+    Список файлов читается потоково (os.scandir или постранично из S3) пачками по batch_size имён,
+    каждая пачка сверяется с Product.image_url, Pet.image_url, ChatMessage.file_path и upload_blob
+    одним запросом на колонку. Файлы моложе грейс-периода не трогаются: их мог только что сохранить
+    ещё не закоммиченный запрос. Возвращает отчёт {'scanned', 'removed', 'bytes'}.
+    """
+    grace = current_app.config['UPLOAD_GC_GRACE'] if grace_seconds is None else grace_seconds
+    batch_size = batch_size or current_app.config['UPLOAD_GC_BATCH']
+    folder = os.path.abspath(current_app.config['UPLOAD_FOLDER'])
+    storage = get_storage()
+    cutoff = time.time() - grace
+    report = {'scanned': 0, 'removed': 0, 'bytes': 0}
+
+    def flush(batch):
+        referenced = _referenced([name for name, _ in batch])
+        for name, size in batch:
+            if name not in referenced and (dry_run or storage.delete(name)):
+                report['removed'] += 1
+                report['bytes'] += size
+
+    batch = []
+    for name, size, mtime in storage.iter_files():
+        if name.endswith(SIDECAR_SUFFIXES):
+            continue
+        report['scanned'] += 1
+        if mtime > cutoff:
+            continue
+        batch.append((name, size))
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+
+    if storage.remote:
+        # Локальные копии удалённых объектов — только кэш: старые удаляются и при надобности скачиваются снова
+        _sweep_derived(storage.cache_folder, '', lambda name: None, cutoff, report, dry_run)
+        _sweep_derived(storage.cache_folder, EXTRACT_DIR, lambda name: None, cutoff, report, dry_run)
+    else:
+        # Производные файлы: .vision рядом с оригиналом и варианты изображений
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.name.endswith(SIDECAR_SUFFIXES) and entry.stat().st_mtime <= cutoff:
+                    source = entry.name.rsplit('.', 1)[0]
+                    if not os.path.exists(os.path.join(folder, source)):
+                        _remove(entry.path, report, dry_run)
+        _sweep_derived(folder, VARIANT_DIR, lambda name: name.rsplit('.', 2)[0], cutoff, report, dry_run)
+        # Кэш текста документов (ключ — sha256 содержимого): истекает по возрасту, при надобности извлекается заново
+        _sweep_derived(folder, EXTRACT_DIR, lambda name: None, cutoff, report, dry_run)
+    # Брошенные временные загрузки
+    _sweep_derived(folder, INCOMING_DIR, lambda name: None, cutoff, report, dry_run)
+
+    metrics.inc('uploads.gc_removed', report['removed'])
+    metrics.inc('uploads.gc_reclaimed_bytes', report['bytes'])
+    logger.info(f"Очистка загрузок: просмотрено {report['scanned']}, удалено {report['removed']}, "
+                f"освобождено {report['bytes'] // 1024} КБ{' (пробный запуск)' if dry_run else ''}")
+    return report
+
+
+def run_once(app):
+    """Один проход сборщика; между процессами gunicorn его выполняет только владелец файловой блокировки"""
+    with app.app_context():
+        lock_path = os.path.join(os.path.abspath(app.config['UPLOAD_FOLDER']), LOCK_FILE)
+        with open(lock_path, 'a') as lock:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return None
+            try:
+                removed, freed = purge_unreferenced()
+                report = sweep()
+                report['removed'] += removed
+                report['bytes'] += freed
+                return report
+            finally:
+                db.session.remove()
+
+
+def start_upload_gc(app):
+    """Фоновый поток, раз в UPLOAD_GC_INTERVAL секунд собирающий неиспользуемые загрузки"""
+    interval = app.config['UPLOAD_GC_INTERVAL']
+    if interval <= 0:
+        return None
+
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                run_once(app)
+            except Exception as e:
+                logger.error(f"Ошибка очистки загрузок: {e!r}")
+
+    thread = threading.Thread(target=loop, name='upload-gc', daemon=True)
+    thread.start()
+    return thread
+
+
+@click.command('sweep-uploads')
+@click.option('--grace', type=int, default=None, help='Only remove files older than this many seconds (default UPLOAD_GC_GRACE)')
+@click.option('--dry-run', is_flag=True, help='Report what would be removed without deleting anything')
+@with_appcontext
+def sweep_uploads_command(grace, dry_run):
+    """Delete upload files that no product, pet or chat message references."""
+    if not dry_run:
+        removed, freed = purge_unreferenced(grace)
+        click.echo(f'Unreferenced blobs: removed {removed}, freed {freed} bytes')
+    report = sweep(grace, dry_run=dry_run)
+    click.echo(f"Scanned {report['scanned']} files, {'would remove' if dry_run else 'removed'} "
+               f"{report['removed']}, {report['bytes']} bytes")
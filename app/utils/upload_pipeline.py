@@ -0,0 +1,204 @@
+# app/utils/upload_pipeline.py
+import hashlib
+import logging
+import os
+import tempfile
+from collections import namedtuple
+from functools import wraps
+from flask import Request, current_app, g, request
+from werkzeug.exceptions import RequestEntityTooLarge, UnsupportedMediaType
+from app.config import Config
+from app.utils import metrics
+from app.utils.chat_images import sniff_mime_type
+
+logger = logging.getLogger(__name__)
+
+INCOMING_DIR = '.incoming'  # недописанные загрузки; переименовываются в UPLOAD_FOLDER атомарно
+MAGIC_BYTES = 16  # тип определяется по первым байтам
+SNIFF_BYTES = 64 * 1024  # в пределах этого окна ищутся размеры изображения (у JPEG они за EXIF)
+FORM_OVERHEAD = 64 * 1024  # запас на остальные поля формы при проверке Content-Length
+
+IMAGE_EXTENSIONS = {'image/png': 'png', 'image/jpeg': 'jpg', 'image/gif': 'gif', 'image/webp': 'webp'}
+DOCUMENT_TYPES = {
+    'pdf': 'application/pdf',
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'doc': 'application/msword',
+    'txt': 'text/plain',
+}
+
+UploadPolicy = namedtuple('UploadPolicy', 'mime_types max_bytes')
+
+
+def get_policy(kind):
+    if kind == 'image':
+        return UploadPolicy(frozenset(IMAGE_EXTENSIONS), Config.UPLOAD_IMAGE_MAX_BYTES)
+    if kind == 'chat':
+        return UploadPolicy(frozenset(IMAGE_EXTENSIONS) | frozenset(DOCUMENT_TYPES.values()), Config.MAX_CONTENT_LENGTH)
+    raise ValueError(f'Unknown upload policy: {kind}')
+
+
+def _extension(filename):
+    return filename.rsplit('.', 1)[1].lower() if filename and '.' in filename else ''
+
+
+def sniff_upload_type(head, filename):
+    """MIME-тип по содержимому; документы должны совпадать с расширением имени"""
+    mime_type = sniff_mime_type(head[:MAGIC_BYTES])
+    if mime_type:
+        return mime_type
+    extension = _extension(filename)
+    if head.startswith(b'%PDF-'):
+        return DOCUMENT_TYPES['pdf'] if extension == 'pdf' else None
+    if head.startswith(b'PK\x03\x04'):
+        return DOCUMENT_TYPES['docx'] if extension == 'docx' else None
+    if head.startswith(b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'):
+        return DOCUMENT_TYPES['doc'] if extension == 'doc' else None
+    if extension == 'txt' and b'\x00' not in head:
+        return DOCUMENT_TYPES['txt']
+    return None
+
+
+def image_dimensions(head, mime_type):
+    """(ширина, высота) из заголовка изображения или None, если в head их ещё нет"""
+    if mime_type == 'image/png' and len(head) >= 24:
+        return int.from_bytes(head[16:20], 'big'), int.from_bytes(head[20:24], 'big')
+    if mime_type == 'image/gif' and len(head) >= 10:
+        return int.from_bytes(head[6:8], 'little'), int.from_bytes(head[8:10], 'little')
+    if mime_type == 'image/webp' and len(head) >= 30:
+        chunk = head[12:16]
+        if chunk == b'VP8X':
+            return 1 + int.from_bytes(head[24:27], 'little'), 1 + int.from_bytes(head[27:30], 'little')
+        if chunk == b'VP8 ':
+            return int.from_bytes(head[26:28], 'little') & 0x3fff, int.from_bytes(head[28:30], 'little') & 0x3fff
+        if chunk == b'VP8L':
+            bits = int.from_bytes(head[21:25], 'little')
+            return (bits & 0x3fff) + 1, ((bits >> 14) & 0x3fff) + 1
+        return None
+    if mime_type == 'image/jpeg':
+        i = 2
+        while i + 9 <= len(head):
+            if head[i] != 0xFF:
+                return None
+            marker = head[i + 1]
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                return int.from_bytes(head[i + 7:i + 9], 'big'), int.from_bytes(head[i + 5:i + 7], 'big')
+            i += 2 + int.from_bytes(head[i + 2:i + 4], 'big')
+    return None
+
+
+class UploadSink:
+    """Файл формы, который пишется прямо во временный файл рядом с хранилищем.
+
+    Пока байты приходят, считается sha256, а по первым килобайтам проверяются тип и размеры —
+    неподходящая загрузка обрывается до того, как будет принята целиком.
+    """
+
+    def __init__(self, folder, policy, filename):
+        incoming = os.path.join(folder, INCOMING_DIR)
+        os.makedirs(incoming, exist_ok=True)
+        fd, self.tmp_path = tempfile.mkstemp(dir=incoming)
+        self._file = os.fdopen(fd, 'w+b')
+        self.policy = policy
+        self.filename = filename
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.head = bytearray()
+        self.mime_type = None
+        self.dimensions = None
+        self.committed = False
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.policy.max_bytes:
+            self._reject(RequestEntityTooLarge(
+                f'File too large. Maximum size is {self.policy.max_bytes // (1024 * 1024)}MB'))
+        if len(self.head) < SNIFF_BYTES:
+            self.head += data[:SNIFF_BYTES - len(self.head)]
+            self._inspect(final=False)
+        self.digest.update(data)
+        return self._file.write(data)
+
+    def seek(self, offset, whence=0):
+        # Парсер формы перематывает файл в начало, когда часть дочитана
+        if self.mime_type is None:
+            self._inspect(final=True)
+        return self._file.seek(offset, whence)
+
+    def _inspect(self, final):
+        if self.mime_type is None:
+            if len(self.head) < MAGIC_BYTES and not final:
+                return
+            mime_type = sniff_upload_type(bytes(self.head), self.filename)
+            if mime_type not in self.policy.mime_types:
+                self._reject(UnsupportedMediaType(
+                    'Недопустимый тип файла: содержимое не соответствует разрешённым форматам'))
+            self.mime_type = mime_type
+        if self.dimensions is None and self.mime_type in IMAGE_EXTENSIONS:
+            dimensions = image_dimensions(bytes(self.head), self.mime_type)
+            if dimensions is None:
+                return
+            width, height = dimensions
+            if not width or not height or width * height > Config.UPLOAD_IMAGE_MAX_PIXELS:
+                self._reject(UnsupportedMediaType(f'Недопустимые размеры изображения: {width}x{height}'))
+            self.dimensions = dimensions
+
+    def _reject(self, error):
+        # Отклонённый файл не попадает в request.files, и закрыть его при завершении запроса некому
+        metrics.inc('uploads.rejected')
+        self.close()
+        raise error
+
+    @property
+    def extension(self):
+        # Расширение изображения берётся из содержимого, а не из имени, присланного клиентом
+        return IMAGE_EXTENSIONS.get(self.mime_type) or _extension(self.filename) or 'bin'
+
+    def finish(self):
+        """Дописать файл на диск; дальше временным файлом распоряжается хранилище"""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self.committed = True
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+        if not self.committed:
+            try:
+                os.remove(self.tmp_path)
+            except FileNotFoundError:
+                pass
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+
+class UploadRequest(Request):
+    """Request, который пишет файлы форм через UploadSink, если обработчик объявил upload_policy"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        policy = g.get('upload_policy')
+        if policy is None:
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        return UploadSink(os.path.abspath(current_app.config['UPLOAD_FOLDER']), policy, filename)
+
+
+def upload_policy(kind):
+    """Принимать файлы формы по политике kind ('image' или 'chat').
+
+    Форма разбирается до вызова обработчика, так что 413/415 не попадают в его try/except.
+    """
+    policy = get_policy(kind)
+
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if request.content_length and request.content_length > policy.max_bytes + FORM_OVERHEAD:
+                metrics.inc('uploads.rejected')
+                raise RequestEntityTooLarge(f'File too large. Maximum size is {policy.max_bytes // (1024 * 1024)}MB')
+            g.upload_policy = policy
+            if request.mimetype == 'multipart/form-data':
+                request.files
+            return fn(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,160 @@
+# app/utils/upload_store.py
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import time
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy.exc import IntegrityError
+from werkzeug.utils import secure_filename
+from app import db
+from app.models.upload_model import UploadBlob
+from app.utils import metrics
+from app.utils.blob_storage import get_storage
+from app.utils.upload_pipeline import INCOMING_DIR, UploadSink
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+BLOB_NAME = re.compile(r'^[0-9a-f]{64}\.[a-z0-9]+$')
+SIDECAR_SUFFIXES = ('.vision',)
+
+
+def is_blob_name(name):
+    """True для имён хранилища (<sha256>.<ext>); старые загрузки называются <uuid>_<имя>"""
+    return bool(name) and BLOB_NAME.match(name) is not None
+
+
+def _place(tmp_path, name, size):
+    """Передать временный файл в хранилище под именем name (или отбросить, если такой блоб уже есть)"""
+    if get_storage().put_file(name, tmp_path):
+        metrics.inc('uploads.stored')
+    else:
+        metrics.inc('uploads.deduplicated')
+        metrics.inc('uploads.deduplicated_bytes', size)
+    return name, size
+
+
+def save_upload(file_storage):
+    """Записать загрузку в хранилище под именем <sha256>.<ext>.
+
+    Одинаковое содержимое хранится один раз: если такой блоб уже есть, временная копия удаляется.
+    Файлы, принятые через upload_policy, уже лежат во временном файле с готовым хэшем —
+    их остаётся только передать хранилищу (get_storage). Остальные копируются по частям с подсчётом sha256.
+    Возвращает (имя, размер). Счётчик ссылок не меняется — для этого acquire_upload.
+    """
+    sink = file_storage.stream
+    if isinstance(sink, UploadSink):
+        sink.finish()
+        try:
+            return _place(sink.tmp_path, f'{sink.digest.hexdigest()}.{sink.extension}', sink.size)
+        except BaseException:
+            sink.committed = False
+            sink.close()
+            raise
+
+    folder = os.path.abspath(current_app.config['UPLOAD_FOLDER'])
+    incoming = os.path.join(folder, INCOMING_DIR)
+    os.makedirs(incoming, exist_ok=True)
+    filename = secure_filename(file_storage.filename or '')
+    extension = filename.rsplit('.', 1)[1].lower() if '.' in filename else 'bin'
+
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=incoming)
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = file_storage.stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+        return _place(tmp_path, f'{digest.hexdigest()}.{extension}', size)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def acquire_upload(name, size=None):
+    """+1 ссылка на блоб в текущей транзакции (коммитит вызывающий)"""
+    if not is_blob_name(name):
+        return
+    values = {UploadBlob.refcount: UploadBlob.refcount + 1, UploadBlob.updated_at: datetime.utcnow()}
+    if UploadBlob.query.filter_by(name=name).update(values, synchronize_session=False):
+        return
+    if size is None:
+        size = get_storage().stat(name)[0]
+    try:
+        with db.session.begin_nested():
+            db.session.add(UploadBlob(name=name, size=size, refcount=1, updated_at=datetime.utcnow()))
+    except IntegrityError:
+        # Параллельная загрузка тех же байтов успела создать строку
+        UploadBlob.query.filter_by(name=name).update(values, synchronize_session=False)
+
+
+def release_upload(name):
+    """-1 ссылка на блоб в текущей транзакции; файл удаляет purge_unreferenced после грейс-периода.
+
+    Старые uuid-загрузки счётчика не имеют: когда на них перестаёт ссылаться строка,
+    их подбирает фоновый сборщик (upload_gc) — обработчик запроса файлы не удаляет.
+    """
+    if not name:
+        return
+    name = name.strip('/')
+    if is_blob_name(name):
+        UploadBlob.query.filter(UploadBlob.name == name, UploadBlob.refcount > 0).update(
+            {UploadBlob.refcount: UploadBlob.refcount - 1, UploadBlob.updated_at: datetime.utcnow()},
+            synchronize_session=False
+        )
+
+
+def purge_unreferenced(grace_seconds=None, limit=500):
+    """Удалить блобы без ссылок, не менявшиеся дольше грейс-периода. Возвращает (число, байты)"""
+    grace = current_app.config['UPLOAD_BLOB_GRACE'] if grace_seconds is None else grace_seconds
+    cutoff = datetime.utcnow() - timedelta(seconds=grace)
+    candidates = db.session.query(UploadBlob.name, UploadBlob.size) \
+        .filter(UploadBlob.refcount == 0, UploadBlob.updated_at < cutoff) \
+        .order_by(UploadBlob.updated_at).limit(limit).all()
+
+    storage = get_storage()
+    removed = freed = 0
+    for name, size in candidates:
+        # Условие повторяется в DELETE: ссылка могла появиться после выборки
+        deleted = UploadBlob.query.filter(
+            UploadBlob.name == name, UploadBlob.refcount == 0, UploadBlob.updated_at < cutoff
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        if not deleted:
+            continue
+        stat = storage.stat(name)
+        if stat is None or stat[1] > time.time() - grace:
+            continue  # те же байты только что загрузили снова — файл остаётся, строка появится заново
+        storage.delete(name)
+        for suffix in SIDECAR_SUFFIXES:
+            try:
+                os.remove(storage.cached_path(name) + suffix)
+            except FileNotFoundError:
+                pass
+        removed += 1
+        freed += size
+    if removed:
+        logger.info(f"Удалено неиспользуемых загрузок: {removed}, освобождено {freed // 1024} КБ")
+    metrics.inc('uploads.purged', removed)
+    metrics.inc('uploads.purged_bytes', freed)
+    return removed, freed
+
+
+@click.command('purge-uploads')
+@click.option('--grace', type=int, default=None, help='Seconds an unreferenced blob is kept (default UPLOAD_BLOB_GRACE)')
+@with_appcontext
+def purge_uploads_command(grace):
+    """Delete content-addressed uploads that no row references any more."""
+    removed, freed = purge_unreferenced(grace)
+    click.echo(f'Removed {removed} blobs, freed {freed} bytes')
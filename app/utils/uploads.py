@@ -0,0 +1,157 @@
+# app/utils/uploads.py
+import hashlib
+import mimetypes
+import os
+from flask import Response, current_app, redirect, request, send_file
+from werkzeug.datastructures import ContentRange
+from werkzeug.exceptions import NotFound, RequestedRangeNotSatisfiable
+from werkzeug.http import http_date
+from werkzeug.security import safe_join
+from app.config import Config
+from app.utils import image_variants
+from app.utils.blob_storage import CHUNK_SIZE, get_storage
+from app.utils.chat_images import is_image, sniff_mime_type
+from app.utils.upload_store import is_blob_name
+
+# Служебные файлы рядом с загрузками (кэш текста документов, data URL для vision) наружу не отдаются
+PRIVATE_SUFFIXES = ('.vision',)
+
+
+def check_upload_name(filename):
+    """Имя загрузки без служебных частей или NotFound"""
+    if any(part.startswith('.') for part in filename.replace('\\', '/').split('/')) \
+            or filename.endswith(PRIVATE_SUFFIXES):
+        raise NotFound()
+    return filename
+
+
+def resolve_upload(filename):
+    """Абсолютный путь к загруженному файлу в локальном хранилище или NotFound"""
+    storage = get_storage()
+    path = safe_join(storage.folder, check_upload_name(filename))
+    if path is None or storage.stat(filename) is None:
+        raise NotFound()
+    return path
+
+
+def upload_etag(filename, stat):
+    """stat — (размер, mtime) из хранилища"""
+    if is_blob_name(filename):
+        return filename.split('.', 1)[0]  # имя хранилища — это sha256 содержимого
+    # Имена старых загрузок уникальны и файлы не перезаписываются, поэтому имя + размер + mtime
+    # однозначно определяют содержимое — ETag можно объявлять сильным (годится для Range/If-Range)
+    size, mtime = stat
+    key = f'{filename}:{size}:{mtime}'.encode('utf-8')
+    return hashlib.sha1(key).hexdigest()
+
+
+def _cache_headers(response, public):
+    response.cache_control.public = public
+    response.cache_control.private = not public
+    response.cache_control.immutable = True
+    return response
+
+
+def send_upload(filename, public=True, width=None, height=None, fmt=None):
+    """Отдать загруженный файл (или его уменьшенный вариант) с кэш-заголовками.
+
+    Локальные файлы и варианты отдаёт send_file(conditional=True): 304 на If-None-Match /
+    If-Modified-Since, 206 на Range, тело через wsgi.file_wrapper или X-Sendfile при USE_X_SENDFILE.
+    Оригиналы из удалённого хранилища — редиректом на подписанную ссылку или потоком через
+    приложение (UPLOAD_SERVE_MODE). ValueError — для неподдерживаемого fmt.
+    """
+    storage = get_storage()
+    width, height, fmt = image_variants.normalize(width, height, fmt)
+    if not storage.remote:
+        path = resolve_upload(filename)
+        stat = storage.stat(filename)
+    else:
+        check_upload_name(filename)
+        if '/' in filename:
+            raise NotFound()
+        # У блобов ETag — это имя, и повторный запрос получает 304 без обращения к хранилищу
+        stat = None if is_blob_name(filename) else storage.stat(filename)
+        if stat is None and not is_blob_name(filename):
+            raise NotFound()
+        path = None
+    etag = original_etag = upload_etag(filename, stat)
+    wants_variant = bool(width or height) and is_image(filename) and image_variants.Image is not None
+    if wants_variant:
+        etag = f'{original_etag}-{width or 0}x{height or 0}-{fmt or "auto"}'
+    max_age = current_app.config['UPLOAD_CACHE_MAX_AGE']
+
+    if storage.remote and request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        response.cache_control.max_age = max_age
+        return _cache_headers(response, public)
+
+    if wants_variant:
+        source = path or storage.cached_path(filename)
+        # Удалённый оригинал скачивается, только если варианта ещё нет в кэше
+        if path is None and not os.path.exists(image_variants.variant_path(source, width, height, fmt)) \
+                and storage.local_copy(filename) is None:
+            raise NotFound()
+        variant = image_variants.get_variant(source, width, height, fmt)
+        if variant is not None:
+            try:
+                with open(variant, 'rb') as f:
+                    mimetype = sniff_mime_type(f.read(16))
+                # Вариант однозначно определяется оригиналом и параметрами — Last-Modified берём от оригинала
+                response = send_file(variant, mimetype=mimetype, conditional=True, etag=etag,
+                                     last_modified=stat[1] if stat else None, max_age=max_age)
+                return _cache_headers(response, public)
+            except FileNotFoundError:  # вытеснен из кэша между построением и отдачей — отдаём оригинал
+                pass
+        etag = original_etag
+
+    if path is not None:
+        response = send_file(path, conditional=True, etag=etag, last_modified=stat[1], max_age=max_age)
+        return _cache_headers(response, public)
+    if current_app.config.get('UPLOAD_SERVE_MODE', Config.UPLOAD_SERVE_MODE) == 'redirect':
+        return _redirect_remote(storage, filename, public)
+    return _proxy_remote(storage, filename, etag, stat, public, max_age)
+
+
+def _redirect_remote(storage, filename, public):
+    response = redirect(storage.url(filename), code=302)
+    # Ссылка подписана на S3_PRESIGN_TTL — сам редирект кэшируется заметно меньше
+    response.cache_control.max_age = storage.presign_ttl // 2
+    response.cache_control.public = public
+    response.cache_control.private = not public
+    return response
+
+
+def _stream(body):
+    try:
+        for chunk in iter(lambda: body.read(CHUNK_SIZE), b''):
+            yield chunk
+    finally:
+        body.close()
+
+
+def _proxy_remote(storage, filename, etag, stat, public, max_age):
+    """Тело объекта потоком через приложение; Range передаётся хранилищу"""
+    stat = stat or storage.stat(filename)
+    if stat is None:
+        raise NotFound()
+    size, mtime = stat
+    start = stop = None
+    if request.range is not None and request.if_range.etag in (None, etag) and request.if_range.date is None:
+        byte_range = request.range.range_for_length(size)
+        if byte_range is None:
+            raise RequestedRangeNotSatisfiable(length=size)
+        start, stop = byte_range
+
+    body = storage.open(filename, start, stop)
+    response = Response(_stream(body), status=200 if start is None else 206,
+                        mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+                        direct_passthrough=True)
+    response.content_length = size if start is None else stop - start
+    if start is not None:
+        response.content_range = ContentRange('bytes', start, stop, size)
+    response.accept_ranges = 'bytes'
+    response.set_etag(etag)
+    response.headers['Last-Modified'] = http_date(mtime)
+    response.cache_control.max_age = max_age
+    return _cache_headers(response, public)
@@ -0,0 +1,51 @@
+# app/utils/user_cache.py
+import threading
+import time
+from collections import namedtuple
+from app import db
+from app.config import Config
+from app.models.user_model import User
+from app.utils import metrics
+from .role_utils import get_user_data_with_permissions
+
+# Снимок пользователя для авторизации; поля совпадают с User, поэтому подходит для role_utils.
+# data — готовый ответ get_user_data_with_permissions.
+UserContext = namedtuple('UserContext', 'id username email role isBanned data')
+
+_cache = {}
+_lock = threading.Lock()
+
+
+def _load(user_id):
+    row = db.session.query(User.id, User.username, User.email, User.role, User.isBanned) \
+        .filter(User.id == user_id).first()
+    if row is None:
+        return None
+    context = UserContext(row.id, row.username, row.email, row.role, row.isBanned, None)
+    return context._replace(data=get_user_data_with_permissions(context))
+
+
+def get_user_context(user_id):
+    """Пользователь, роль, бан и права из кэша процесса (TTL USER_CACHE_TTL), при промахе — из БД"""
+    now = time.monotonic()
+    with _lock:
+        entry = _cache.get(user_id)
+    if entry and entry[0] > now:
+        metrics.inc('user_cache.hit')
+        return entry[1]
+
+    metrics.inc('user_cache.miss')
+    context = _load(user_id)
+    if context is not None:
+        with _lock:
+            if len(_cache) >= Config.USER_CACHE_MAX_SIZE:
+                _cache.pop(next(iter(_cache)))
+            _cache[user_id] = (now + Config.USER_CACHE_TTL, context)
+    return context
+
+
+def invalidate_user(*user_ids):
+    """Сбросить кэш после смены роли, бана, удаления или изменения профиля"""
+    with _lock:
+        for user_id in user_ids:
+            _cache.pop(user_id, None)
@@ -0,0 +1,183 @@
+# app/utils/user_import.py
+import csv
+import logging
+from itertools import islice
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models.user_model import User, Role
+from app.utils.password_hasher import hash_passwords
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_COLUMNS = ('username', 'email', 'password')
+
+
+class ImportReport:
+    """Итог импорта: число созданных пользователей и ошибки по номерам строк CSV"""
+
+    def __init__(self, max_errors):
+        self.created = 0
+        self.rows = 0
+        self.errors = []
+        self.errors_truncated = False
+        self.max_errors = max_errors
+
+    def error(self, line, message):
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'line': line, 'message': message})
+        else:
+            self.errors_truncated = True
+
+    def to_dict(self):
+        return {
+            'rows': self.rows,
+            'created': self.created,
+            'failed': self.rows - self.created,
+            'errors': sorted(self.errors, key=lambda error: error['line']),
+            'errors_truncated': self.errors_truncated
+        }
+
+
+def _validate(row, allowed_roles, email_regex, password_regex):
+    """Нормализованная строка CSV или сообщение об ошибке"""
+    username = (row.get('username') or '').strip()
+    email = (row.get('email') or '').strip()
+    password = row.get('password') or ''
+    role_value = (row.get('role') or Role.CLIENT.value).strip().upper()
+
+    if not username or len(username) > User.username.type.length:
+        return None, 'Invalid username'
+    if not email_regex.match(email) or len(email) > User.email.type.length:
+        return None, 'Invalid email format'
+    if not password_regex.match(password):
+        return None, 'Password must be at least 6 characters and contain at least one letter and one number'
+    try:
+        role = Role(role_value)
+    except ValueError:
+        return None, f'Invalid role: {role_value}'
+    if role not in allowed_roles:
+        return None, f'Role {role.value} cannot be imported'
+    return {'username': username, 'email': email, 'password': password, 'role': role}, None
+
+
+def _flush(batch, report):
+    """Вставка пачки одной командой INSERT; при конфликте — построчно, чтобы найти виновные строки"""
+    emails = [row['email'] for _, row in batch]
+    usernames = [row['username'] for _, row in batch]
+    taken = db.session.query(User.email, User.username).filter(
+        or_(User.email.in_(emails), User.username.in_(usernames))
+    ).all()
+    taken_emails = {row.email for row in taken}
+    taken_usernames = {row.username for row in taken}
+
+    pending = []
+    for line, row in batch:
+        if row['email'] in taken_emails:
+            report.error(line, 'Email already taken')
+        elif row['username'] in taken_usernames:
+            report.error(line, 'Username already taken')
+        else:
+            pending.append((line, row))
+    if not pending:
+        return
+
+    hashes = hash_passwords([row['password'] for _, row in pending])
+    values = [
+        {'username': row['username'], 'email': row['email'], 'password': pw_hash, 'role': row['role'], 'isBanned': False}
+        for (_, row), pw_hash in zip(pending, hashes)
+    ]
+
+    try:
+        db.session.execute(User.__table__.insert(), values)
+        db.session.commit()
+        report.created += len(values)
+        return
+    except IntegrityError:
+        # Кто-то занял email/username между проверкой и вставкой
+        db.session.rollback()
+
+    for (line, _), value in zip(pending, values):
+        try:
+            db.session.execute(User.__table__.insert(), [value])
+            db.session.commit()
+            report.created += 1
+        except IntegrityError:
+            db.session.rollback()
+            report.error(line, 'Email or username already taken')
+
+
+def import_users(lines, allowed_roles=tuple(Role), batch_size=None, max_rows=None):
+    """Потоковый импорт пользователей из CSV (username,email,password[,role]).
+
+    `lines` — любой итерируемый источник строк (открытый файл, TextIOWrapper над потоком запроса).
+    Файл читается построчно, в памяти держится только текущая пачка из batch_size строк.
+    Ошибочные строки попадают в отчёт и не прерывают импорт остальных.
+    С max_rows файл сначала дочитывается до лимита и целиком отклоняется (ValueError), если строк больше.
+    """
+    from app.routes.auth_routes import EMAIL_REGEX, PASSWORD_REGEX
+
+    batch_size = max(1, batch_size or current_app.config['USER_IMPORT_BATCH_SIZE'])
+    report = ImportReport(current_app.config['USER_IMPORT_MAX_ERRORS'])
+    reader = csv.DictReader(lines)
+
+    fieldnames = [name.strip().lower() for name in (reader.fieldnames or [])]
+    missing = [column for column in REQUIRED_COLUMNS if column not in fieldnames]
+    if missing:
+        raise ValueError(f'Missing CSV columns: {missing}')
+    reader.fieldnames = fieldnames
+
+    seen_emails, seen_usernames = set(), set()
+    batch = []
+    rows = ((reader.line_num, row) for row in reader)
+    try:
+        if max_rows:
+            # Лимит проверяется до первой вставки, чтобы не оставлять файл импортированным наполовину
+            rows = list(islice(rows, max_rows + 1))
+            if len(rows) > max_rows:
+                raise ValueError(f'Too many rows: at most {max_rows} per request, use `flask import-users` for larger files')
+        for line, row in rows:
+            report.rows += 1
+            data, error = _validate(row, allowed_roles, EMAIL_REGEX, PASSWORD_REGEX)
+            if error is None and data['email'] in seen_emails:
+                error = 'Duplicate email in file'
+            if error is None and data['username'] in seen_usernames:
+                error = 'Duplicate username in file'
+            if error:
+                report.error(line, error)
+                continue
+            seen_emails.add(data['email'])
+            seen_usernames.add(data['username'])
+            batch.append((line, data))
+            if len(batch) >= batch_size:
+                _flush(batch, report)
+                batch = []
+    except (csv.Error, UnicodeDecodeError) as e:
+        # Остаток файла нечитаем — сохраняем то, что уже разобрано
+        report.error(reader.line_num, f'Unreadable CSV: {e}')
+    if batch:
+        _flush(batch, report)
+
+    logger.info(f"Импорт пользователей: создано {report.created} из {report.rows} строк")
+    return report
+
+
+@click.command('import-users')
+@click.argument('csv_path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', type=int, default=None, help='Rows per INSERT (default USER_IMPORT_BATCH_SIZE)')
+@with_appcontext
+def import_users_command(csv_path, batch_size):
+    """Import users from a CSV file with username,email,password[,role] columns."""
+    with open(csv_path, encoding='utf-8-sig', newline='') as csv_file:
+        try:
+            report = import_users(csv_file, batch_size=batch_size)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+    for error in report.errors:
+        click.echo(f"line {error['line']}: {error['message']}", err=True)
+    if report.errors_truncated:
+        click.echo('... more errors omitted', err=True)
+    click.echo(f'Created {report.created} of {report.rows} users')
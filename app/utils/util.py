@@ -1,15 +1,68 @@
 # app/util.py
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from flask import jsonify
+from functools import wraps
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
+from app import db
+from app.models.user_model import User
+from app.utils.role_utils import claims_allow
+from app.utils.user_cache import get_user_context
 
 def role_required(*roles):
+    # Allowed role values are computed once, when the decorator is applied
+    allowed = frozenset(role.value for role in roles)
+
     def wrapper(fn):
+        @wraps(fn)
         @jwt_required()
         def decorator(*args, **kwargs):
-            current_user = get_jwt_identity()
-            if current_user['role'] not in [role.value for role in roles]:
-                return jsonify({'message': 'Доступ запрещен'}), 403
+            if get_jwt_identity()['role'] not in allowed:
+                return {'message': 'Доступ запрещен'}, 403
             return fn(*args, **kwargs)
-        decorator.__name__ = fn.__name__
         return decorator
-    return wrapper
\ No newline at end of file
+    return wrapper
+
+def permission_required(*actions):
+    """Require actions from the token's 'perms' claim (see role_utils.permission_claims).
+
+    Like token_required, also rejects deleted and banned users (checked via user_cache).
+    """
+    def wrapper(fn):
+        @wraps(fn)
+        @jwt_required()
+        def decorator(*args, **kwargs):
+            claims = get_jwt()
+            if not all(claims_allow(claims, action) for action in actions):
+                return {'message': 'Доступ запрещен'}, 403
+            current_user = get_user_context(get_jwt_identity()['id'])
+            if not current_user:
+                return {'message': 'Пользователь не найден!'}, 401
+            if current_user.isBanned:
+                return {'message': 'Ваш аккаунт заблокирован. Обратитесь в поддержку.'}, 403
+            return fn(*args, **kwargs)
+        return decorator
+    return wrapper
+
+def parse_fields(raw, allowed):
+    """Поля из ?fields=id,name,price в порядке модели (без параметра — все). ValueError для неизвестных"""
+    if not raw:
+        return tuple(allowed)
+    requested = {name.strip() for name in raw.split(',') if name.strip()}
+    unknown = requested.difference(allowed)
+    if unknown:
+        raise ValueError(f"Неизвестные поля: {', '.join(sorted(unknown))}")
+    return tuple(name for name in allowed if name in requested) or tuple(allowed)
+
+def load_owners(owner_ids):
+    """{id: {'id', 'username'}} для владельцев списка одним запросом"""
+    ids = {owner_id for owner_id in owner_ids if owner_id}
+    if not ids:
+        return {}
+    rows = db.session.query(User.id, User.username).filter(User.id.in_(ids))
+    return {row.id: {'id': row.id, 'username': row.username} for row in rows}
+
+def owner_summary(owner_id, owners=None):
+    """Вложенный owner ответа; owners — заранее загруженные load_owners"""
+    if not owner_id:
+        return None
+    if owners is None:
+        owners = load_owners([owner_id])
+    return owners.get(owner_id)
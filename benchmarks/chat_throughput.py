@@ -0,0 +1,82 @@
+"""Chat throughput benchmark against the offline stub LLM backend.
+
+Measures our own overhead per POST /chat (prompt building, DB writes, summary
+updates) separately from model latency. Runs against a throwaway SQLite
+database unless DATABASE_URL is set.
+
+    python benchmarks/chat_throughput.py --requests 400 --threads 8 --latency-ms 0
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--latency-ms', type=int, default=0, help='stub model latency')
+    args = parser.parse_args()
+
+    os.environ['LLM_BACKEND'] = 'stub'
+    os.environ['LLM_STUB_LATENCY_MS'] = str(args.latency_ms)
+    # All requests come from one client address; the per-client chat limit would turn most of them into 429s
+    os.environ['RATE_LIMIT_CHAT'] = ''
+    os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db'))
+
+    from app import create_app
+    app = create_app()
+    # Identity is a dict; newer flask-jwt-extended verifies that "sub" is a string
+    app.config['JWT_VERIFY_SUB'] = False
+
+    client = app.test_client()
+    tokens = []
+    for i in range(args.threads):
+        response = client.post('/auth/register', json={
+            'username': f'bench{i}_{time.time_ns()}',
+            'email': f'bench{i}_{time.time_ns()}@example.com',
+            'password': 'bench123'
+        })
+        tokens.append(response.get_json()['access_token'])
+
+    per_thread = args.requests // args.threads
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def worker(token):
+        local_client = app.test_client()
+        headers = {'Authorization': f'Bearer {token}'}
+        for i in range(per_thread):
+            started = time.perf_counter()
+            response = local_client.post('/chat', data={'message': f'Какой корм подойдёт собаке? #{i}'}, headers=headers)
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if response.status_code != 201:
+                    errors.append(response.status_code)
+
+    threads = [threading.Thread(target=worker, args=(token,)) for token in tokens]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    print(f'requests: {len(latencies)}  errors: {len(errors)}  threads: {args.threads}  stub latency: {args.latency_ms}ms')
+    print(f'throughput: {len(latencies) / wall:.1f} req/s')
+    print(f'latency p50: {statistics.median(latencies) * 1000:.1f}ms  '
+          f'p95: {latencies[int(0.95 * (len(latencies) - 1))] * 1000:.1f}ms  '
+          f'max: {latencies[-1] * 1000:.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
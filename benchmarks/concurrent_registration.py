@@ -0,0 +1,80 @@
+"""Concurrent registration benchmark for POST /auth/register.
+
+Fires registrations from many threads at once against a running server, so
+ID assignment and uniqueness are exercised by the real database:
+
+    python run.py &
+    python benchmarks/concurrent_registration.py --base-url http://localhost:5000 --users 200 --threads 20
+
+With --same-email every thread registers the same address; exactly one request
+must succeed and every other one must be rejected with 400, never 500.
+"""
+import argparse
+import collections
+import json
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+
+def register(base_url, username, email):
+    body = json.dumps({'username': username, 'email': email, 'password': 'bench123'}).encode('utf-8')
+    req = urllib.request.Request(f'{base_url}/auth/register', data=body,
+                                 headers={'Content-Type': 'application/json'}, method='POST')
+    try:
+        with urllib.request.urlopen(req, timeout=30) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://localhost:5000')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=20)
+    parser.add_argument('--same-email', action='store_true', help='all threads race for one email')
+    args = parser.parse_args()
+
+    run_id = uuid.uuid4().hex[:8]
+    statuses = collections.Counter()
+    latencies = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(args.threads)
+    per_thread = args.users // args.threads
+
+    def worker(thread_no):
+        barrier.wait()  # стартуем одновременно, чтобы регистрации конкурировали
+        for i in range(per_thread):
+            suffix = 'same' if args.same_email else f'{thread_no}_{i}'
+            username = f'bench_{run_id}_{thread_no}_{i}'
+            email = f'bench_{run_id}_{suffix}@example.com'
+            started = time.perf_counter()
+            status = register(args.base_url, username, email)
+            with lock:
+                statuses[status] += 1
+                latencies.append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(args.threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    print(f'registrations: {len(latencies)}  threads: {args.threads}  wall: {wall:.2f}s  '
+          f'throughput: {len(latencies) / wall:.1f} req/s')
+    print(f'latency p50: {statistics.median(latencies) * 1000:.1f}ms  '
+          f'p95: {latencies[int(0.95 * (len(latencies) - 1))] * 1000:.1f}ms')
+    print('status codes:', dict(sorted(statuses.items())))
+    if statuses.get(500):
+        print('FAIL: registrations failed with 500')
+
+
+if __name__ == '__main__':
+    main()
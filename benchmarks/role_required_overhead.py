@@ -0,0 +1,95 @@
+"""Micro-benchmark of authorization overhead per request.
+
+Compares, inside a real request context with a signed access token:
+  * jwt_required alone (the floor every protected endpoint pays);
+  * the previous role_required, which rebuilt the allowed list on every call;
+  * the current role_required with its precomputed frozenset;
+  * permission_required, which checks the bit-mask claim;
+and the bare permission lookups (list scan vs frozenset vs bit mask).
+
+    python benchmarks/role_required_overhead.py --number 20000
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from flask import Flask
+from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
+
+from app.models.user_model import Role
+from app.utils.role_utils import (ROLE_PERMISSIONS, ROLE_ACTION_SETS, ACTION_BITS, permission_claims,
+                                  can_perform_action)
+from app.utils.util import role_required, permission_required
+
+
+def legacy_role_required(*roles):
+    def wrapper(fn):
+        @jwt_required()
+        def decorator(*args, **kwargs):
+            current_user = get_jwt_identity()
+            if current_user['role'] not in [role.value for role in roles]:
+                return {'message': 'Доступ запрещен'}, 403
+            return fn(*args, **kwargs)
+        decorator.__name__ = fn.__name__
+        return decorator
+    return wrapper
+
+
+def endpoint():
+    return 'ok'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--number', type=int, default=20000)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config['JWT_SECRET_KEY'] = 'benchmark-secret-key-of-sufficient-length'
+    # Identity is a dict; newer flask-jwt-extended verifies that "sub" is a string
+    app.config['JWT_VERIFY_SUB'] = False
+    JWTManager(app)
+
+    with app.app_context():
+        token = create_access_token(identity={'id': 1, 'username': 'bench', 'role': Role.OWNER.value},
+                                    additional_claims=permission_claims(Role.OWNER))
+
+    roles = (Role.SELLER, Role.ADMIN, Role.OWNER)
+    variants = {
+        'jwt_required only': jwt_required()(endpoint),
+        'role_required (legacy)': legacy_role_required(*roles)(endpoint),
+        'role_required (frozenset)': role_required(*roles)(endpoint),
+        'permission_required (claim)': permission_required('update_any_product')(endpoint),
+    }
+
+    headers = {'Authorization': f'Bearer {token}'}
+    with app.test_request_context('/', headers=headers):
+        print(f'{"decorated call":34s} {"µs/call":>10s}')
+        for name, fn in variants.items():
+            assert fn() == 'ok', name
+            seconds = timeit.timeit(fn, number=args.number)
+            print(f'{name:34s} {seconds / args.number * 1e6:10.2f}')
+
+    class User:
+        role = Role.OWNER
+
+    user = User()
+    action = 'view_system_stats'
+    mask = permission_claims(user.role)['perms']  # as decoded from the token
+    checks = {
+        'list scan (legacy)': lambda: action in ROLE_PERMISSIONS[user.role]['actions'],
+        'frozenset': lambda: action in ROLE_ACTION_SETS[user.role],
+        'can_perform_action': lambda: can_perform_action(user, action),
+        'bit mask (claim)': lambda: bool(mask & ACTION_BITS[action]),
+    }
+    print(f'\n{"permission lookup":34s} {"ns/call":>10s}')
+    for name, fn in checks.items():
+        seconds = timeit.timeit(fn, number=args.number * 10)
+        print(f'{name:34s} {seconds / (args.number * 10) * 1e9:10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Benchmark of uploaded-image delivery with and without HTTP caching.
+
+Simulates a browser that views the same catalog image --views times:
+  * legacy: send_from_directory with default headers, so every view downloads the full body;
+  * cached: send_upload, where repeat views revalidate with If-None-Match and get 304
+    (with Cache-Control: immutable a real browser skips even those requests until max-age);
+  * range: a video-style client fetching the file in --chunk byte ranges.
+Reports bytes transferred and CPU time per request.
+
+    python benchmarks/upload_caching.py --size-kb 2048 --views 500
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from flask import Flask, send_from_directory
+
+from app.config import Config
+from app.utils.uploads import send_upload
+
+
+def build_app(folder):
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    # Always the local backend: the benchmark measures our own send path, not S3
+    app.config['UPLOAD_STORAGE'] = 'local'
+    app.config['UPLOAD_FOLDER'] = folder
+    app.config['UPLOAD_CACHE_MAX_AGE'] = 31536000
+
+    @app.route('/legacy/<path:filename>')
+    def legacy(filename):
+        return send_from_directory(folder, filename)
+
+    @app.route('/get/<path:filename>')
+    def cached(filename):
+        return send_upload(filename)
+
+    return app
+
+
+def run(client, requests):
+    """requests: list of (url, headers); returns (status counts, body bytes, CPU seconds)"""
+    statuses, transferred = {}, 0
+    started = time.process_time()
+    for url, headers in requests:
+        response = client.get(url, headers=headers)
+        body = response.get_data()
+        response.close()
+        transferred += len(body)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+    return statuses, transferred, time.process_time() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size-kb', type=int, default=2048, help='Size of the test image')
+    parser.add_argument('--views', type=int, default=500, help='Repeat views of the same image')
+    parser.add_argument('--chunk', type=int, default=256 * 1024, help='Range request size in bytes')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        name = '0b5f3c1e9d2a4f7e8c6b1a3d5e7f9a0b.jpg'
+        with open(os.path.join(folder, name), 'wb') as f:
+            f.write(os.urandom(args.size_kb * 1024))
+
+        app = build_app(folder)
+        client = app.test_client()
+
+        first = client.get(f'/get/{name}')
+        etag = first.headers['ETag']
+        print(f'Cache-Control: {first.headers["Cache-Control"]}')
+        print(f'ETag: {etag}\n')
+        first.close()
+
+        size = args.size_kb * 1024
+        scenarios = {
+            'legacy (full body every view)': [(f'/legacy/{name}', {})] * args.views,
+            'cached (If-None-Match -> 304)': [(f'/get/{name}', {})] +
+                                             [(f'/get/{name}', {'If-None-Match': etag})] * (args.views - 1),
+            'range requests (206)': [(f'/get/{name}', {'Range': f'bytes={start}-{start + args.chunk - 1}'})
+                                     for start in range(0, size, args.chunk)],
+        }
+
+        print(f'{"scenario":32s} {"requests":>9s} {"statuses":>18s} {"MB sent":>9s} {"µs CPU/req":>11s}')
+        for label, requests in scenarios.items():
+            statuses, transferred, cpu = run(client, requests)
+            status_text = ' '.join(f'{code}x{count}' for code, count in sorted(statuses.items()))
+            print(f'{label:32s} {len(requests):9d} {status_text:>18s} {transferred / 2**20:9.1f} '
+                  f'{cpu / len(requests) * 1e6:11.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""user id sequence and unique username
+
+Revision ID: c84e2f0b6d17
+Revises: b3f1c7d2a9e4
+Create Date: 2026-10-19 11:03:27.904511
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c84e2f0b6d17'
+down_revision = 'b3f1c7d2a9e4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # User creation by admins never checked usernames, so older databases may hold
+    # duplicates; stop with a readable list instead of a constraint violation.
+    duplicates = op.get_bind().execute(sa.text(
+        'SELECT username, COUNT(*) FROM "user" GROUP BY username HAVING COUNT(*) > 1 ORDER BY username'
+    )).fetchall()
+    if duplicates:
+        listed = ', '.join(f'{username!r} ({count} users)' for username, count in duplicates[:20])
+        more = f' and {len(duplicates) - 20} more' if len(duplicates) > 20 else ''
+        raise RuntimeError(
+            f'Cannot add a unique constraint on user.username: duplicate usernames {listed}{more}. '
+            'Rename the duplicate accounts and run the upgrade again.'
+        )
+
+    # Registration used to assign max(id) + 1 explicitly, so the serial sequence
+    # never advanced; move it past the existing rows before relying on it.
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute(
+            "SELECT setval(pg_get_serial_sequence('\"user\"', 'id'), "
+            "COALESCE((SELECT MAX(id) FROM \"user\"), 0) + 1, false)"
+        )
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.create_unique_constraint('user_username_key', ['username'])
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_constraint('user_username_key', type_='unique')